@@ -83,16 +83,52 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'labs.common.backends.postgresql_pool',
         'NAME': get_env_variable('PGDATABASE'),
         'USER': get_env_variable('PGUSER'),
         'PASSWORD': get_env_variable('PGPASSWORD'),
         'HOST': get_env_variable('PGHOST','127.0.0.1'),
         'PORT': get_env_variable('PGPORT', '5432'),
+        # per process: size max_connections for workers * MAX_SIZE
+        'POOL': {
+            'MIN_SIZE': int(get_env_variable('PGPOOL_MIN_SIZE', '1')),
+            'MAX_SIZE': int(get_env_variable('PGPOOL_MAX_SIZE', '10')),
+            'TIMEOUT': float(get_env_variable('PGPOOL_TIMEOUT', '5')),
+            'HEALTH_CHECK': True,
+            'LOG_EVERY': 1000,
+        },
     },
 }
 
 PG_VERSION = '9.5'
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'labs.common.cache.LRULocMemCache',
+        'LOCATION': 'labs',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    'files': {
+        'BACKEND': 'labs.common.cache.LRUFileBasedCache',
+        'LOCATION': os.path.join(ROOT_DIR, 'cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# cache used by `LabQuerySet.cached()`. The locmem cache is per process: a
+# gunicorn worker would keep serving entries invalidated by the writes of
+# the others, the file based cache is shared by all of them.
+LABS_QUERYSET_CACHE = 'files'
 DB_SERVER_CFG_FILE = os.path.join(ROOT_DIR, 'config/server.cfg')
 
 # Password validation
@@ -185,6 +221,18 @@ LOGGING = {
             'level': LOGGING_LEVEL,
             'propagate': False
         },
+        'labs.nplusone': {
+            'handlers': ['console'],
+            'level': LOGGING_LEVEL,
+            'propagate': False
+        },
+        'labs.pool': {
+            'handlers': ['console'],
+            'level': LOGGING_LEVEL,
+            'propagate': False
+        },
     }
 }
 
+# Queries repeated more than NPLUSONE_THRESHOLD times are reported as N+1
+NPLUSONE_THRESHOLD = 5
@@ -1,4 +1,8 @@
 from .base import *
 
 DEBUG = True
-LOGGING_LEVEL = 'DEBUG'
\ No newline at end of file
+LOGGING_LEVEL = 'DEBUG'
+
+MIDDLEWARE_CLASSES += [
+    'labs.common.nplusone.NPlusOneMiddleware',
+]
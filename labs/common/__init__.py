@@ -0,0 +1 @@
+default_app_config = 'labs.common.apps.QuerysetsConfig'
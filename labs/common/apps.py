@@ -3,3 +3,17 @@ from django.apps import AppConfig
 
 class QuerysetsConfig(AppConfig):
     name = 'labs.common'
+
+    def ready(self):
+        from .cache import connect_invalidation, register_dependency
+        from .mixins import SerializationMixin
+        from .models import (Community, CommunityLocation, Member, Event,
+                             Registration, EventSummary)
+        # build the field metadata registry once, before the first request
+        for model in self.get_models():
+            if issubclass(model, SerializationMixin):
+                model.field_metadata()
+        connect_invalidation(Community, Member, Event, Registration)
+        # maintained by the registration and event triggers
+        register_dependency(EventSummary, Registration, Event)
+        register_dependency(CommunityLocation, Community)
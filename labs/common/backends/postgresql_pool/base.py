@@ -0,0 +1,60 @@
+"""
+PostgreSQL backend checking connections out of a per-process pool instead
+of opening one per request:
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'labs.common.backends.postgresql_pool',
+            ...
+            'POOL': {
+                'MIN_SIZE': 1,       # opened up front and kept idle
+                'MAX_SIZE': 10,      # checked out at once per process
+                'TIMEOUT': 5,        # seconds to wait for a free connection
+                'HEALTH_CHECK': True,  # SELECT 1 before reusing a connection
+                'LOG_EVERY': 0,      # log the statistics every N checkouts
+            },
+        },
+    }
+
+Closing the Django connection (at the end of each request with the
+default CONN_MAX_AGE of 0) returns it to the pool with a reset session.
+The pools are closed before the test database is destroyed.
+"""
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        self.creation = DatabaseCreation(self)
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.get_connection_params(),
+                        self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        # the connection goes back to the pool it came from
+        self._connection_pool = get_pool(self.alias, conn_params,
+                                         self.settings_dict.get('POOL', {}))
+        connection = self._connection_pool.getconn()
+        # same as the psycopg2 backend, the pooled connections are reset
+        # to the state of a new connection
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._connection_pool.putconn(self.connection)
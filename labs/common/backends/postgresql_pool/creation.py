@@ -0,0 +1,13 @@
+from django.db.backends.postgresql import creation
+
+from .pool import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # the idle pooled connections to the test database, of this alias
+        # and of `_nodb_connection`, would make DROP DATABASE fail
+        close_pools()
+        super(DatabaseCreation, self)._destroy_test_db(test_database_name,
+                                                       verbosity)
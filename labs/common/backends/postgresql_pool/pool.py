@@ -0,0 +1,222 @@
+"""
+Per-process pool of psycopg2 connections.
+
+`ThreadedConnectionPool` raises `PoolError` as soon as `maxconn`
+connections are checked out. `BlockingConnectionPool` makes the caller
+wait for a connection to be returned, up to a timeout, checks that a
+reused connection is still alive and resets its session state when it is
+returned. It counts the checkouts, waits and their latency to size the
+pools against the postgres `max_connections`: at most
+`processes * MAX_SIZE` connections are opened per database.
+"""
+import os
+import logging
+import threading
+from timeit import default_timer
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+
+
+logger = logging.getLogger('labs.pool')
+
+# resets the session state (settings, prepared statements, cursors,
+# LISTEN, advisory locks, temporary tables) of a returned connection like
+# DISCARD ALL, then restores the time zone and encoding set by Django: they
+# would otherwise be SET and committed again on every checkout
+RESET_SQL = ('RESET ALL; DEALLOCATE ALL; CLOSE ALL; UNLISTEN *; '
+             'SELECT pg_advisory_unlock_all(); DISCARD PLANS; DISCARD TEMP; '
+             'DISCARD SEQUENCES; SET TIME ZONE %s; SET client_encoding TO %s')
+
+
+class PoolTimeout(PoolError):
+    """
+    Raised when no connection was returned to the pool within the
+    checkout timeout.
+    """
+
+
+class PoolStatistics(object):
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.checkout_time = 0.0
+        self.max_checkout_time = 0.0
+
+    def record(self, duration, waited):
+        self.checkouts += 1
+        self.waits += waited
+        self.checkout_time += duration
+        self.max_checkout_time = max(self.max_checkout_time, duration)
+
+    @property
+    def avg_checkout_time(self):
+        if not self.checkouts:
+            return 0.0
+        return self.checkout_time / self.checkouts
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    Opens `minconn` connections up front and keeps up to `minconn` idle
+    ones, at most `maxconn` are checked out at once. `getconn` waits up to
+    `timeout` seconds for a connection to be returned then raises
+    `PoolTimeout`.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, health_check=True,
+                 log_every=0, *args, **kwargs):
+        ThreadedConnectionPool.__init__(self, minconn, maxconn,
+                                        *args, **kwargs)
+        self.timeout = timeout
+        self.health_check = health_check
+        self.log_every = log_every
+        self.statistics = PoolStatistics()
+        self._available = threading.Condition(self._lock)
+
+    def getconn(self, key=None):
+        while True:
+            conn, reused = self._checkout(key)
+            # only the idle connections can have been closed meanwhile
+            if not (reused and self.health_check) or self._is_alive(conn):
+                return conn
+            with self._available:
+                self.statistics.discarded += 1
+                self._putconn(conn, close=True)
+                self._available.notify()
+
+    def _checkout(self, key):
+        start = default_timer()
+        deadline = start + self.timeout
+        waited = False
+        with self._available:
+            while len(self._used) >= self.maxconn and not self.closed:
+                remaining = deadline - default_timer()
+                if remaining <= 0:
+                    self.statistics.timeouts += 1
+                    raise PoolTimeout(
+                        "No connection returned to the pool within "
+                        "{0}s ({1} in use)".format(self.timeout,
+                                                   len(self._used)))
+                waited = True
+                self._available.wait(remaining)
+            reused = bool(self._pool)
+            conn = self._getconn(key)
+            self.statistics.record(default_timer() - start, waited)
+            if self.log_every and \
+                    not self.statistics.checkouts % self.log_every:
+                logger.info("pool %s: %s", os.getpid(), self.as_dict())
+        return conn, reused
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+            # back to the state of a new connection
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def putconn(self, conn, key=None, close=False):
+        if self.closed:
+            # closed by `close_pools()` along with its connections
+            return
+        # network round trips are made before taking the lock
+        if not close:
+            close = not self._reset(conn)
+        with self._available:
+            self._putconn(conn, key, close)
+            self._available.notify()
+
+    def _reset(self, conn):
+        """
+        Rolls back, resets the session and restores the new connection
+        state of `conn`, returns False if it is not reusable.
+        """
+        if conn.closed:
+            return False
+        try:
+            conn.rollback()
+            session = (conn.get_parameter_status('TimeZone'),
+                       conn.get_parameter_status('client_encoding'))
+            conn.autocommit = True
+            cursor = conn.cursor()
+            try:
+                cursor.execute(RESET_SQL, session)
+            finally:
+                cursor.close()
+            conn.autocommit = False
+        except psycopg2.Error:
+            return False
+        return True
+
+    def as_dict(self):
+        """
+        Statistics of the pool, times in seconds.
+        """
+        statistics = self.statistics
+        return {
+            'active': len(self._used),
+            'idle': len(self._pool),
+            'min_size': self.minconn,
+            'max_size': self.maxconn,
+            'checkouts': statistics.checkouts,
+            'waits': statistics.waits,
+            'timeouts': statistics.timeouts,
+            'discarded': statistics.discarded,
+            'avg_checkout_time': statistics.avg_checkout_time,
+            'max_checkout_time': statistics.max_checkout_time,
+        }
+
+
+# (pid, alias, connection parameters) -> pool
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    The pool of the current process for `alias`. Pools inherited from a
+    parent process through fork are never used: their sockets are shared
+    with the parent.
+    """
+    key = (os.getpid(), alias, tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = BlockingConnectionPool(
+                options.get('MIN_SIZE', 1), options.get('MAX_SIZE', 10),
+                options.get('TIMEOUT', 5), options.get('HEALTH_CHECK', True),
+                options.get('LOG_EVERY', 0), **conn_params)
+        return pool
+
+
+def close_pools():
+    """
+    Closes the pools of the current process and all of their connections,
+    e.g. before dropping the database they are connected to.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        for key in [key for key in _pools if key[0] == pid]:
+            _pools.pop(key).closeall()
+
+
+def pool_statistics():
+    """
+    {alias: statistics} of the pools of the current process.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        return dict((alias, pool.as_dict())
+                    for (owner, alias, _), pool in _pools.items()
+                    if owner == pid)
@@ -0,0 +1,286 @@
+"""
+Queryset result cache.
+
+`LabQuerySet.cached()` stores the results of a queryset under a key made
+of its compiled SQL, its parameters and the current generation of every
+table the SQL reads. Writing to a table replaces its generation, so the
+entries depending on it are never read again and age out through the
+TTL and the LRU eviction of the cache backend; nothing has to be listed
+or deleted.
+
+Generations are dropped by the `post_save` receiver connected by
+`connect_invalidation` and by `invalidate_model`, called by the write
+paths which don't send it (`update()`, `bulk_create()`, COPY, upserts,
+deletes, ...): the next read of the table starts a new one. Deletes are
+invalidated once per table from the counts returned by the collector:
+`post_delete` or `m2m_changed` receivers would disable the fast (single
+statement) deletes of Django. Dropping a generation is a single cache
+delete, nearly free when the table has no cached entry.
+
+Inside a transaction the tables are invalidated once, on commit, and the
+cache is bypassed by the connection until then: it would otherwise store
+uncommitted rows where the other processes read them. Nothing is cached
+by a transaction rolled back, there is nothing to invalidate.
+
+The locmem backends are per process, a process never sees the
+invalidations of the others: use the file based backend when several
+processes serve the same database.
+"""
+import os
+import uuid
+import hashlib
+from collections import OrderedDict
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache, dummy
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import signals
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.encoding import force_bytes
+
+
+KEY_PREFIX = 'labs:queryset'
+
+_lru_caches = {}
+_missing = object()
+
+
+class LRULocMemCache(LocMemCache):
+    """
+    `LocMemCache` evicting the least recently used entries: reads and
+    writes move the key to the end of an ordered dict, culling drops
+    `MAX_ENTRIES / CULL_FREQUENCY` keys from its start.
+    """
+
+    def __init__(self, name, params):
+        super(LRULocMemCache, self).__init__(name, params)
+        self._cache = _lru_caches.setdefault(name, OrderedDict())
+
+    def get(self, key, default=None, version=None, acquire_lock=True):
+        value = super(LRULocMemCache, self).get(key, _missing, version,
+                                                acquire_lock)
+        if value is _missing:
+            return default
+        key = self.make_key(key, version=version)
+        with (self._lock.writer() if acquire_lock else dummy()):
+            if key in self._cache:
+                self._cache[key] = self._cache.pop(key)
+        return value
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._cache.pop(key, None)
+        super(LRULocMemCache, self)._set(key, value, timeout)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            return self.clear()
+        count = max(len(self._cache) // self._cull_frequency, 1)
+        for key in list(islice(self._cache, count)):
+            self._delete(key)
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """
+    `FileBasedCache` evicting the least recently used entries: reads touch
+    the modification time of the file, culling removes the oldest files.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super(LRUFileBasedCache, self).get(key, _missing, version)
+        if value is _missing:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version), None)
+        except OSError:
+            pass  # removed by another process meanwhile
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def modified(fname):
+            try:
+                return os.path.getmtime(fname)
+            except OSError:
+                return 0
+
+        filelist.sort(key=modified)
+        for fname in filelist[:max(num_entries // self._cull_frequency, 1)]:
+            self._delete(fname)
+
+
+def queryset_cache():
+    return caches[getattr(settings, 'LABS_QUERYSET_CACHE', 'default')]
+
+
+def model_tables():
+    """
+    Tables of the installed models, m2m tables included.
+    """
+    return set(model._meta.db_table
+               for model in apps.get_models(include_auto_created=True))
+
+
+def _generation_key(table):
+    return '{0}:generation:{1}'.format(KEY_PREFIX, table)
+
+
+def generations(tables):
+    """
+    Current generation of each of `tables`. A table without generation
+    (never read, invalidated or evicted) gets a new random one, which
+    can't bring back the entries of a previous generation.
+    """
+    cache = queryset_cache()
+    keys = [_generation_key(table) for table in tables]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            token = uuid.uuid4().hex
+            cache.add(key, token, None)
+            current[key] = cache.get(key, token)
+    return [current[key] for key in keys]
+
+
+def invalidate_tables(*tables):
+    queryset_cache().delete_many([_generation_key(table) for table in tables])
+
+
+# db_table -> tables whose rows are derived from it by triggers
+_dependents = dict()
+
+
+def register_dependency(model, *sources):
+    """
+    Invalidates `model` along with each of `sources`, for the tables
+    maintained by database triggers (e.g. the event summary).
+    """
+    for source in sources:
+        _dependents.setdefault(source._meta.db_table, set()).add(
+            model._meta.db_table)
+
+
+class _Invalidation(object):
+    """
+    `on_commit` callback invalidating `tables`, recognizable among the
+    commit hooks of a connection.
+    """
+
+    def __init__(self, tables):
+        self.tables = set(tables)
+
+    def __call__(self):
+        invalidate_tables(*self.tables)
+
+
+def pending_invalidations(using=None):
+    """
+    Tables written by the current transaction of the `using` database, to
+    be invalidated on commit.
+    """
+    connection = transaction.get_connection(using or DEFAULT_DB_ALIAS)
+    tables = set()
+    for sids, func in connection.run_on_commit:
+        if isinstance(func, _Invalidation):
+            tables.update(func.tables)
+    return tables
+
+
+def invalidate_model(*models, **kwargs):
+    """
+    Invalidates the cached querysets reading the tables of `models`, right
+    away or, inside a transaction of the `using` database, on commit.
+    """
+    tables = set()
+    for model in models:
+        table = model._meta.db_table
+        tables.add(table)
+        tables.update(_dependents.get(table, ()))
+    connection = transaction.get_connection(
+        kwargs.get('using') or DEFAULT_DB_ALIAS)
+    if not connection.in_atomic_block:
+        invalidate_tables(*tables)
+        return
+    # one hook per savepoint: it is discarded along with the savepoint
+    # when it is rolled back
+    savepoints = set(connection.savepoint_ids)
+    for sids, func in connection.run_on_commit:
+        if isinstance(func, _Invalidation) and sids == savepoints:
+            func.tables.update(tables)
+            return
+    connection.on_commit(_Invalidation(tables))
+
+
+def invalidate_deleted(rows_count, using=None):
+    """
+    Invalidates the models of the `{model label: rows}` counts returned by
+    `QuerySet.delete()` and `Model.delete()`, cascades included.
+    """
+    models = [apps.get_model(label) for label, rows in rows_count.items()
+              if rows]
+    if models:
+        invalidate_model(*models, using=using)
+
+
+def _invalidate_instance(sender, **kwargs):
+    invalidate_model(sender, using=kwargs.get('using'))
+
+
+def connect_invalidation(*models):
+    """
+    Invalidates the tables of `models` on every `post_save`.
+    """
+    for model in models:
+        signals.post_save.connect(
+            _invalidate_instance, sender=model,
+            dispatch_uid='labs_cache_{0}'.format(model._meta.label_lower))
+
+
+def cache_key(queryset):
+    """
+    Key of the `queryset` results, None when it can't match any row.
+    """
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    compiler = queryset.query.clone().get_compiler(using=queryset.db)
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        return None
+    with connection.cursor() as cursor:
+        # the statement sent to postgres, the params repr isn't stable
+        statement = cursor.mogrify(sql, params)
+    # the quoted names also catch the tables of RawSQL and subqueries
+    tables = sorted(table for table in model_tables() if qn(table) in sql)
+    digest = hashlib.md5(force_bytes(repr((
+        queryset.db, queryset._iterable_class.__name__, statement,
+        generations(tables))))).hexdigest()
+    return '{0}:{1}'.format(KEY_PREFIX, digest)
+
+
+def cached_results(queryset, timeout=DEFAULT_TIMEOUT):
+    """
+    The list of `queryset` results, from the cache when available.
+    """
+    if queryset.query.select_for_update or pending_invalidations(queryset.db):
+        # locks or uncommitted rows, which must not be shared
+        return list(queryset.iterator())
+    key = cache_key(queryset)
+    if key is None:
+        return []
+    cache = queryset_cache()
+    results = cache.get(key)
+    if results is None:
+        results = list(queryset.iterator())
+        cache.set(key, results, timeout)
+    return results
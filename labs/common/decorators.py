@@ -1,23 +1,62 @@
 from functools import wraps
-from django.db import connection
+from timeit import default_timer
 
-from .logging import getLogger
+from .instrumentation import QueryRecorder
+from .signals import query_statistics_recorded
 
 
 def query_statistic(func):
+    """
+    Prints the number of queries performed by `func`, their total time,
+    the fetched rows and the min/max/p95 durations. The `QueryStatistics`
+    of the last call is kept on `wrapper.statistics` and sent with the
+    `query_statistics_recorded` signal.
+    """
     @wraps(func)
     def func_wrapper(*args, **kwargs):
-        query_count = len(connection.queries)
-        time = 0.0
+        with QueryRecorder() as statistics:
+            result = func(*args, **kwargs)
+        func_wrapper.statistics = statistics
+        query_statistics_recorded.send(sender=func, statistics=statistics)
+        print(statistics)
+        return result
+    func_wrapper.statistics = None
+    return func_wrapper
+
+
+def time_statistic(func):
+    @wraps(func)
+    def func_wrapper(*args, **kwargs):
+        start = default_timer()
         result = func(*args, **kwargs)
-        queries_number = len(connection.queries) - query_count
-        performed_query_list = connection.queries[-queries_number:]
-        for query in performed_query_list:
-            if query['sql'] == 'BEGIN':
-                queries_number -= 1  # ignore begin transaction
-            else:
-                time += float(query['time'])
-        message = "[Statistics] : {total} queries performed in {time}s."
-        print(message.format(total=queries_number, time=time))
+        message = "[Statistics] : {name} executed in {time:.4f}s."
+        print(message.format(name=func.__name__, time=default_timer() - start))
         return result
     return func_wrapper
+
+
+def query_guarantee(queries, touch=None, args=()):
+    """
+    Documents that evaluating the queryset returned by the decorated
+    queryset method, called with `args`, then calling `touch` on every
+    object, performs at most `queries` queries whatever the number of
+    rows. The guarantees are checked by the tests of `labs.common` and,
+    against the current data, by the `check_query_counts` command.
+    """
+    def decorator(func):
+        func.query_guarantee = (queries, touch, args)
+        return func
+    return decorator
+
+
+def query_guarantees(queryset_class):
+    """
+    Yields (name, queries, touch, args) of the methods of `queryset_class`
+    decorated with `query_guarantee`.
+    """
+    for name in sorted(dir(queryset_class)):
+        guarantee = getattr(getattr(queryset_class, name, None),
+                            'query_guarantee', None)
+        if guarantee is not None:
+            queries, touch, args = guarantee
+            yield name, queries, touch, args
@@ -0,0 +1,185 @@
+"""
+Chunked, collector-free deletion.
+
+`QuerySet.delete()` makes the deletion collector load the primary keys of
+every row and of every cascaded row in Python, then deletes everything
+in one transaction. Here the cascades are planned once from the model
+metadata and each chunk of rows is deleted with set-based statements in
+its own short transaction.
+"""
+from collections import namedtuple
+from timeit import default_timer
+
+from django.db import connections, transaction
+from django.db.models import signals
+from django.db.models.deletion import (CASCADE, SET_NULL, SET_DEFAULT, PROTECT,
+                                       DO_NOTHING, ProtectedError,
+                                       get_candidate_relations_to_delete)
+
+from .cache import invalidate_model
+
+
+CHUNK_SIZE = 1000
+
+# (related model, foreign key, on_delete, children) of a cascade plan
+Cascade = namedtuple('Cascade', ['model', 'field', 'action', 'children'])
+
+
+class ChunkReport(namedtuple('ChunkReport', ['deleted', 'updated',
+                                             'lock_time'])):
+    """
+    Rows deleted and set to NULL/default per model label for one chunk,
+    and how long its transaction held the locks.
+    """
+
+    @property
+    def rows(self):
+        return sum(self.deleted.values())
+
+
+class DeleteReport(namedtuple('DeleteReport', ['chunks', 'duration'])):
+
+    @property
+    def rows(self):
+        return sum(chunk.rows for chunk in self.chunks)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(self.duration, 1e-6)
+
+    @property
+    def max_lock_time(self):
+        return max([chunk.lock_time for chunk in self.chunks] or [0.0])
+
+
+def plan_cascades(model, seen=None):
+    """
+    Returns the cascade tree of `model` deletions from the `on_delete` of
+    the relations pointing to it. Raises `ProtectedError` when a PROTECT
+    relation is found, the affected rows are unknown at planning time.
+    """
+    seen = set() if seen is None else seen
+    plan = list()
+    for related in get_candidate_relations_to_delete(model._meta):
+        field = related.field
+        action = field.remote_field.on_delete
+        if action is DO_NOTHING:
+            continue
+        if action is PROTECT:
+            raise ProtectedError(
+                "{0}.{1} protects {2} from deletion".format(
+                    related.related_model.__name__, field.name,
+                    model.__name__), [])
+        if action not in (CASCADE, SET_NULL, SET_DEFAULT):
+            raise ValueError("Unsupported on_delete for {0}.{1}".format(
+                related.related_model.__name__, field.name))
+        children = list()
+        if action is CASCADE and field not in seen:
+            children = plan_cascades(related.related_model, seen | {field})
+        plan.append(Cascade(related.related_model, field, action, children))
+    return plan
+
+
+def _statements(plan, connection, parent_where):
+    """
+    Yields the (model, sql, params, is_delete) statements of `plan`,
+    children first. `parent_where` returns the SQL selecting a column of
+    the parent rows, its `%s` parameters are the chunk primary keys.
+    """
+    qn = connection.ops.quote_name
+    for cascade in plan:
+        opts = cascade.model._meta
+        table = qn(opts.db_table)
+        target = cascade.field.target_field.column
+        where = '{0} IN ({1})'.format(
+            qn(cascade.field.column), parent_where(target))
+        if cascade.action is CASCADE:
+
+            def child_where(column, table=table, where=where):
+                return 'SELECT {0} FROM {1} WHERE {2}'.format(
+                    qn(column), table, where)
+
+            for statement in _statements(cascade.children, connection,
+                                         child_where):
+                yield statement
+            yield (cascade.model, 'DELETE FROM {0} WHERE {1}'.format(
+                table, where), [], True)
+        else:
+            params = [None]
+            if cascade.action is SET_DEFAULT:
+                params = [cascade.field.get_db_prep_save(
+                    cascade.field.get_default(), connection)]
+            yield (cascade.model, 'UPDATE {0} SET {1} = %s WHERE {2}'.format(
+                table, qn(cascade.field.column), where), params, False)
+
+
+def chunked_delete(queryset, chunk_size=CHUNK_SIZE, send_signals=False,
+                   callback=None):
+    """
+    Deletes the `queryset` rows `chunk_size` at a time. Each chunk runs in
+    its own transaction: the chunk primary keys are locked then the
+    cascaded rows are deleted (or set to NULL/default) with one set-based
+    statement per relation, deepest first, before the rows themselves:
+
+    >>> SELECT community.id FROM community WHERE ... ORDER BY id LIMIT 1000 FOR UPDATE
+    >>> DELETE FROM registration WHERE member_id IN
+        (SELECT id FROM member WHERE community_id IN (SELECT unnest(%s)))
+    >>> DELETE FROM member WHERE community_id IN (SELECT unnest(%s))
+    >>> DELETE FROM community WHERE id IN (SELECT unnest(%s))
+
+    With `send_signals`, `pre_delete`/`post_delete` are sent for the rows
+    of the queryset model (not the cascaded ones), their instances are
+    loaded once per chunk. `callback` receives each `ChunkReport`.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    pk_column = opts.pk.column
+
+    def root_where(column):
+        if column == pk_column:
+            return 'SELECT unnest(%s)'
+        return 'SELECT {0} FROM {1} WHERE {2} IN (SELECT unnest(%s))'.format(
+            qn(column), qn(opts.db_table), qn(pk_column))
+
+    statements = list(_statements(plan_cascades(model), connection,
+                                  root_where))
+    statements.append((model, 'DELETE FROM {0} WHERE {1} IN ({2})'.format(
+        qn(opts.db_table), qn(pk_column), root_where(pk_column)), [], True))
+    chunk_query = queryset.order_by('pk').select_for_update()
+    chunks = list()
+    start = default_timer()
+    while True:
+        with transaction.atomic(using=queryset.db):
+            lock_start = default_timer()
+            pk_list = list(chunk_query.values_list(
+                'pk', flat=True)[:chunk_size])
+            if not pk_list:
+                break
+            instances = list()
+            if send_signals:
+                instances = list(model._default_manager.using(
+                    queryset.db).filter(pk__in=pk_list))
+                for obj in instances:
+                    signals.pre_delete.send(sender=model, instance=obj,
+                                            using=queryset.db)
+            deleted, updated = dict(), dict()
+            with connection.cursor() as cursor:
+                for related_model, sql, params, is_delete in statements:
+                    # every remaining placeholder is the chunk primary keys
+                    cursor.execute(sql, params + [pk_list] * (
+                        sql.count('%s') - len(params)))
+                    counts = deleted if is_delete else updated
+                    label = related_model._meta.label
+                    counts[label] = counts.get(label, 0) + cursor.rowcount
+            for obj in instances:
+                signals.post_delete.send(sender=model, instance=obj,
+                                         using=queryset.db)
+            invalidate_model(*set(statement[0] for statement in statements),
+                             using=queryset.db)
+        chunk = ChunkReport(deleted, updated, default_timer() - lock_start)
+        chunks.append(chunk)
+        if callback is not None:
+            callback(chunk)
+    return DeleteReport(chunks, default_timer() - start)
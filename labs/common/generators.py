@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic data for the lab schema.
+
+Every factory draws from its own `random.Random` seeded from the global
+seed, so the same seed always produces the same rows. Rows are yielded
+one by one and never kept in memory.
+"""
+import random
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Community, Member, Event, Registration
+
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carla', 'Dhia', 'Emma', 'Farid', 'Greta',
+               'Hugo', 'Ines', 'Jonas', 'Karim', 'Lena', 'Mehdi', 'Nora',
+               'Omar', 'Paula', 'Quentin', 'Rania', 'Sven', 'Tarek']
+LAST_NAMES = ['Abbes', 'Bauer', 'Chahed', 'Dupont', 'Engel', 'Fischer',
+              'Garcia', 'Haddad', 'Ibrahim', 'Jensen', 'Klein', 'Lopez',
+              'Martin', 'Nasri', 'Olsen', 'Petit', 'Rossi', 'Schmidt']
+SKILLS = ['python', 'django', 'js', 'angular', 'ruby', 'rails', 'go', 'java',
+          'postgres', 'docker', 'react', 'c', 'rust', 'scala', 'haskell']
+LANGUAGES = ['English', 'French', 'German', 'Arabic', 'Spanish', 'Italian']
+CITIES = ['Berlin', 'Paris', 'Tunis', 'Madrid', 'Rome', 'Munich', 'Lyon']
+TOPICS = ['python', 'django', 'js', 'data', 'devops', 'ruby', 'go']
+
+# [latitude, longitude] boxes communities are located in
+AREAS = [(48.1, 11.5), (52.5, 13.4), (48.8, 2.3), (36.8, 10.1), (40.4, -3.7)]
+
+START = timezone.make_aware(datetime(2016, 1, 1), timezone.utc)
+
+
+def rng(seed, stream):
+    return random.Random(seed * 100 + stream)
+
+
+def communities(count, seed=0):
+    rnd = rng(seed, 1)
+    for i in range(count):
+        lat, lng = rnd.choice(AREAS)
+        locations = [[round(lat + rnd.uniform(-0.5, 0.5), 6),
+                      round(lng + rnd.uniform(-0.5, 0.5), 6)]
+                     for _ in range(rnd.randint(1, 5))]
+        name = '{0}_{1}'.format(rnd.choice(TOPICS), i)
+        yield Community(name=name[:20], locations=locations)
+
+
+def member_info(rnd, first_name):
+    languages = rnd.sample(LANGUAGES, rnd.randint(1, 3))
+    info = {
+        'languages': [{'name': name if rnd.random() < 0.8 else name.lower(),
+                       'level': rnd.randint(0, 10)} for name in languages],
+        'contact': {
+            'personal': {'phone': str(rnd.randint(10 ** 6, 10 ** 7)),
+                         'street': str(rnd.randint(1, 300))},
+        },
+    }
+    if rnd.random() < 0.5:
+        info['contact']['work'] = {'phone': str(rnd.randint(10 ** 6, 10 ** 7)),
+                                   'street': str(rnd.randint(1, 300))}
+    websites = rnd.randint(0, 3)
+    if websites:
+        info['websites'] = ['https://{0}{1}.example.com/{2}'.format(
+            first_name.lower(), rnd.randint(0, 10 ** 6), n)
+            for n in range(websites)]
+    return info
+
+
+def members(count, community_ids, seed=0):
+    rnd = rng(seed, 2)
+    for i in range(count):
+        first_name = rnd.choice(FIRST_NAMES)
+        last_name = rnd.choice(LAST_NAMES)
+        skills = rnd.sample(SKILLS, rnd.randint(0, 8))
+        if skills and rnd.random() < 0.2:
+            skills[0] = skills[0].capitalize()
+        contact = None
+        if rnd.random() < 0.7:
+            contact = {'city': rnd.choice(CITIES),
+                       'phone': str(rnd.randint(10 ** 6, 10 ** 7))}
+        yield Member(
+            first_name=first_name,
+            last_name=last_name,
+            email='{0}.{1}{2}@example.com'.format(
+                first_name, last_name, i).lower(),
+            age=rnd.randint(16, 70),
+            community_id=rnd.choice(community_ids) if community_ids else None,
+            skills=skills,
+            info=member_info(rnd, first_name),
+            contact=contact,
+        )
+
+
+def events(count, seed=0):
+    rnd = rng(seed, 3)
+    for i in range(count):
+        start = START + timedelta(days=rnd.randint(0, 730),
+                                  hours=rnd.randint(8, 20))
+        seats = rnd.randint(20, 500)
+        yield Event(
+            name='{0}_event_{1}'.format(rnd.choice(TOPICS), i)[:20],
+            start=start,
+            end=start + timedelta(hours=rnd.randint(1, 8)),
+            ticket_number=0,
+            ticket_price=rnd.randint(0, 100),
+            seat_number=seats,
+        )
+
+
+def registrations(member_ids, event_ids, per_member, seed=0):
+    """
+    Registers each member to up to `per_member` distinct events, which
+    respects `unique_together = ('member', 'event')`.
+    """
+    rnd = rng(seed, 4)
+    per_member = min(per_member, len(event_ids))
+    for member_id in member_ids:
+        for event_id in rnd.sample(event_ids, rnd.randint(0, per_member)):
+            yield Registration(
+                member_id=member_id,
+                event_id=event_id,
+                ticket=rnd.randint(1, 4),
+                online=rnd.random() < 0.3,
+                discount=rnd.choice([0, 0, 0, 5, 10, 15, 20]),
+                registered_on=START + timedelta(minutes=rnd.randint(0, 10 ** 6)),
+            )
@@ -0,0 +1,129 @@
+"""
+Validated bulk ingestion.
+
+`bulk_create` skips `save()` and the model validation, so bulk loaded
+members would bypass the JSON schema validators. Rows are validated in
+batches before being inserted, invalid rows are set aside as rejects.
+"""
+import json
+from itertools import islice
+from collections import namedtuple
+from timeit import default_timer
+
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Community, Member
+from .validators import MEMBER_VALIDATORS, validate_batch
+
+
+BATCH_SIZE = 1000
+
+
+class IngestionReport(namedtuple('IngestionReport',
+                                 ['total', 'inserted', 'rejected', 'duration'])):
+
+    @property
+    def rows_per_second(self):
+        return self.total / max(self.duration, 1e-6)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def normalize_row(model, row):
+    """
+    Returns the field values of a payload, either a plain dict or an
+    exported `{model, pk, fields}` object, converted with `to_python()`
+    as the deserializers do. Relations are given by primary key.
+    """
+    if 'fields' in row:
+        row = dict(row['fields'], pk=row.get('pk'))
+    metadata = model.field_metadata()
+    fields = dict((f.name, f) for n, attname, f in metadata.serialized_fields)
+    data = dict()
+    errors = dict()
+    for name, value in row.items():
+        if name in ('pk', 'id'):
+            if value is not None:
+                data['pk'] = value
+            continue
+        if name not in fields:
+            errors[name] = ["Unknown field."]
+            continue
+        field = fields[name]
+        try:
+            if field.remote_field is not None:
+                data[field.attname] = field.target_field.to_python(value)
+            else:
+                data[name] = field.to_python(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+    return data, errors
+
+
+def check_fields(model, data, exclude):
+    """
+    Errors of the model field validation of `data` (max_length, integer
+    ranges, choices, ...) except for the `exclude` fields.
+    """
+    try:
+        model(**data).clean_fields(exclude=exclude)
+    except ValidationError as e:
+        return e.message_dict
+    return {}
+
+
+def ingest_members(rows, batch_size=BATCH_SIZE, rejects=None):
+    """
+    Validates the `rows` payloads by batches of `batch_size`: `info`,
+    `skills` and `contact` against their schema, the other fields with
+    their model validators and the communities with one query per batch.
+    The valid ones are inserted with `bulk_create` in chunks of
+    `batch_size`, all inside one transaction. Invalid rows are written to
+    the `rejects` file object as JSON Lines along with their errors.
+    """
+    total = inserted = rejected = 0
+    start = default_timer()
+    # validated by the schemas and by the community lookup below, the
+    # ForeignKey validation makes one query per row
+    exclude = list(MEMBER_VALIDATORS) + ['community']
+    with transaction.atomic():
+        for chunk in chunks(rows, batch_size):
+            normalized = [normalize_row(Member, row) for row in chunk]
+            errors = validate_batch(
+                [data for data, _ in normalized], MEMBER_VALIDATORS)
+            community_ids = set(data.get('community_id')
+                                for data, _ in normalized) - {None}
+            communities = set(Community.objects.filter(
+                pk__in=community_ids).values_list('pk', flat=True))
+            members = list()
+            for index, (data, row_errors) in enumerate(normalized):
+                row_errors.update(errors.get(index, {}))
+                row_errors.update(check_fields(
+                    Member, data, exclude + list(row_errors)))
+                community_id = data.get('community_id')
+                if community_id is not None and \
+                        community_id not in communities:
+                    row_errors['community'] = [
+                        "Community {0} does not exist.".format(community_id)]
+                if row_errors:
+                    rejected += 1
+                    if rejects is not None:
+                        reject = {'row': total + index, 'errors': row_errors,
+                                  'data': chunk[index]}
+                        rejects.write(
+                            json.dumps(reject, cls=DjangoJSONEncoder) + '\n')
+                    continue
+                members.append(Member(**data))
+            Member.objects.bulk_create(members, batch_size=batch_size)
+            inserted += len(members)
+            total += len(chunk)
+    return IngestionReport(total, inserted, rejected, default_timer() - start)
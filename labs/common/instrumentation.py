@@ -0,0 +1,227 @@
+"""
+Query instrumentation.
+
+`connection.queries` is only filled when DEBUG is on. The recorder wraps
+the DB-API cursors created by the connection instead, so every
+execute/executemany and COPY is timed, and the fetched rows counted,
+whatever the settings. The cursors created on the psycopg2 connection
+itself (named cursors) are wrapped with `timed_cursor()`.
+"""
+import traceback
+from math import ceil
+from timeit import default_timer
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class QueryRecord(object):
+    __slots__ = ('sql', 'params', 'duration', 'rows', 'many', 'stack')
+
+    def __init__(self, sql, params, many=False, stack=None):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.stack = stack
+        self.duration = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'sql': self.sql, 'duration': self.duration,
+                'rows': self.rows, 'many': self.many}
+
+
+class QueryStatistics(object):
+    """
+    Queries recorded by a `QueryRecorder`.
+    """
+
+    def __init__(self, capture_stack=False):
+        self.queries = list()
+        self.capture_stack = capture_stack
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time(self):
+        return sum(q.duration for q in self.queries)
+
+    @property
+    def rows(self):
+        return sum(q.rows for q in self.queries)
+
+    @property
+    def min(self):
+        return min(q.duration for q in self.queries) if self.queries else 0.0
+
+    @property
+    def max(self):
+        return max(q.duration for q in self.queries) if self.queries else 0.0
+
+    def percentile(self, percent):
+        """
+        Nearest-rank percentile of the query durations.
+        """
+        if not self.queries:
+            return 0.0
+        durations = sorted(q.duration for q in self.queries)
+        rank = int(ceil(percent / 100.0 * len(durations)))
+        return durations[max(rank, 1) - 1]
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+    def as_dict(self):
+        return {
+            'count': self.count, 'time': self.time, 'rows': self.rows,
+            'min': self.min, 'max': self.max, 'p95': self.p95,
+        }
+
+    def __str__(self):
+        message = ("[Statistics] : {count} queries performed in {time:.6f}s, "
+                   "{rows} rows fetched (min: {min:.6f}s, max: {max:.6f}s, "
+                   "p95: {p95:.6f}s).")
+        return message.format(**self.as_dict())
+
+
+class TimedCursor(object):
+    """
+    Proxy of a DB-API cursor timing the executed queries and counting
+    the fetched rows.
+    """
+
+    def __init__(self, cursor, statistics):
+        self.cursor = cursor
+        self.statistics = statistics
+        self.record = None
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        for row in self.cursor:
+            self._fetched(1)
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _execute(self, method, sql, params, many):
+        stack = None
+        if self.statistics.capture_stack:
+            stack = traceback.extract_stack()[:-2]
+        self.record = QueryRecord(sql, params, many, stack)
+        start = default_timer()
+        try:
+            return method(sql, params)
+        finally:
+            self.record.duration = default_timer() - start
+            self.statistics.queries.append(self.record)
+
+    def _fetched(self, rows, duration=0.0):
+        if self.record is not None:
+            self.record.rows += rows
+            # round trips of the server-side cursors
+            self.record.duration += duration
+
+    def _fetch(self, method, *args, **kwargs):
+        start = default_timer()
+        rows = method(*args, **kwargs)
+        duration = default_timer() - start
+        if rows is None:
+            self._fetched(0, duration)
+        else:
+            self._fetched(len(rows), duration)
+        return rows
+
+    def execute(self, sql, params=None):
+        return self._execute(self.cursor.execute, sql, params, False)
+
+    def executemany(self, sql, param_list):
+        return self._execute(self.cursor.executemany, sql, param_list, True)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        def copy(sql, params):
+            return self.cursor.copy_expert(sql, file, *args, **kwargs)
+        return self._execute(copy, sql, None, False)
+
+    def copy_from(self, file, table, *args, **kwargs):
+        def copy(sql, params):
+            return self.cursor.copy_from(file, table, *args, **kwargs)
+        return self._execute(copy, 'COPY {0} FROM STDIN'.format(table),
+                             None, False)
+
+    def copy_to(self, file, table, *args, **kwargs):
+        def copy(sql, params):
+            return self.cursor.copy_to(file, table, *args, **kwargs)
+        return self._execute(copy, 'COPY {0} TO STDOUT'.format(table),
+                             None, False)
+
+    def fetchone(self):
+        start = default_timer()
+        row = self.cursor.fetchone()
+        self._fetched(int(row is not None), default_timer() - start)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetch(self.cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._fetch(self.cursor.fetchall)
+
+
+def timed_cursor(connection, cursor):
+    """
+    Wraps a cursor created on `connection.connection`, e.g. a named one,
+    so that the active recorders of `connection` see its queries.
+    """
+    for statistics in connection.__dict__.get('_recorded_statistics', ()):
+        cursor = TimedCursor(cursor, statistics)
+    return cursor
+
+
+class QueryRecorder(object):
+    """
+    Records the queries executed on the `using` connection of the
+    current thread, works with DEBUG=False. With `capture_stack` the
+    calling stack of each query is kept as well:
+
+    >>> with QueryRecorder() as statistics:
+    ...     list(Member.objects.select_related('community'))
+    >>> statistics.count, statistics.rows, statistics.p95
+    (1, 2000, 0.0123)
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, capture_stack=False):
+        self.using = using
+        self.statistics = QueryStatistics(capture_stack)
+
+    def __enter__(self):
+        self.connection = connections[self.using]
+        # keep a possible outer recorder in place
+        self._patched = self.connection.__dict__.get('_cursor')
+        create_cursor = self.connection._cursor
+        statistics = self.statistics
+
+        def _cursor(*args, **kwargs):
+            return TimedCursor(create_cursor(*args, **kwargs), statistics)
+
+        self.connection._cursor = _cursor
+        self.connection.__dict__.setdefault(
+            '_recorded_statistics', []).append(statistics)
+        return self.statistics
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection._recorded_statistics.remove(self.statistics)
+        if self._patched is None:
+            del self.connection._cursor
+        else:
+            self.connection._cursor = self._patched
@@ -0,0 +1,69 @@
+"""
+Case-insensitive lookups backed by the expression indexes of
+migration 0006: both sides are lower-cased by the same IMMUTABLE SQL
+functions so the planner can match the indexed expression whatever the
+casing of the stored data or of the searched values.
+"""
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields.jsonb import JSONField
+from django.core.exceptions import FieldError
+from django.db.models import CharField, Lookup
+
+
+class LoweredLookup(Lookup):
+    """
+    Sends the right hand side value untouched: the lower-casing happens
+    in SQL so that python and postgres never disagree on a casing rule.
+    """
+    template = None
+
+    def get_prep_lookup(self):
+        return self.rhs
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [value]
+
+    def as_sql(self, qn, connection):
+        lhs, lhs_params = self.process_lhs(qn, connection)
+        rhs, rhs_params = self.process_rhs(qn, connection)
+        params = lhs_params + rhs_params
+        return self.template % {'lhs': lhs, 'rhs': rhs}, params
+
+
+@ArrayField.register_lookup
+class IContainsAny(LoweredLookup):
+    """
+    Array of strings sharing at least one element with the given list,
+    ignoring case:
+
+    >>> Member.objects.filter(skills__icontains_any=['Python', 'RUBY'])
+    >>> WHERE lab_lower_array(skills) && lab_lower_array(ARRAY['Python', 'RUBY'])
+
+    Registered on every ArrayField, only the arrays of CharField (varchar)
+    are accepted, the other ones raise FieldError.
+    """
+    lookup_name = 'icontains_any'
+    template = ('lab_lower_array(%(lhs)s) && '
+                'lab_lower_array(%(rhs)s::varchar[])')
+
+    def get_prep_lookup(self):
+        base_field = getattr(self.lhs.output_field, 'base_field', None)
+        if not isinstance(base_field, CharField):
+            raise FieldError(
+                "icontains_any only supports arrays of CharField, not "
+                "{0}".format(type(base_field).__name__))
+        if isinstance(self.rhs, (list, tuple)):
+            return list(self.rhs)
+        return self.rhs
+
+
+@JSONField.register_lookup
+class LanguageIExact(LoweredLookup):
+    """
+    `info` documents listing a language of the given name, ignoring case:
+
+    >>> Member.objects.filter(info__language_iexact='French')
+    >>> WHERE lab_language_names(info) @> ARRAY[lower('French')]
+    """
+    lookup_name = 'language_iexact'
+    template = 'lab_language_names(%(lhs)s) @> ARRAY[lower(%(rhs)s)]'
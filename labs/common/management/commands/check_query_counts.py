@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from labs.common.decorators import query_guarantees
+from labs.common.instrumentation import QueryRecorder
+from labs.common.models import Community, Member, Event, Registration
+
+
+MODELS = [Community, Member, Event, Registration]
+
+
+class Command(BaseCommand):
+    help = ('Check the query count guarantees of the Community, Member, '
+            'Event and Registration querysets against the current data')
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-l', '--limit', dest='limit', type=int,
+                            default=500,
+                            help='Rows fetched per queryset, 0 for all')
+
+    def handle(self, *args, **options):
+        limit = options.get('limit')
+        failures = 0
+        for model in MODELS:
+            manager = model._default_manager
+            queryset_class = type(manager.all())
+            for name, queries, touch, args in query_guarantees(queryset_class):
+                queryset = getattr(manager.all(), name)(*args)
+                if limit:
+                    queryset = queryset[:limit]
+                with QueryRecorder(using=queryset.db) as statistics:
+                    objects = list(queryset)
+                    if touch is not None:
+                        for obj in objects:
+                            touch(obj)
+                message = "{0}.objects.{1}(): {2} queries for {3} rows " \
+                          "(at most {4})".format(model.__name__, name,
+                                                 statistics.count,
+                                                 len(objects), queries)
+                if statistics.count > queries:
+                    failures += 1
+                    self.output(message, style="error")
+                elif not objects:
+                    self.output(message + ", no data to check",
+                                style="warning")
+                else:
+                    self.output(message, style="success")
+        if failures:
+            raise CommandError("{0} query count guarantees broken".format(
+                failures))
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
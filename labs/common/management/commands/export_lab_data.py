@@ -0,0 +1,74 @@
+import io
+import sys
+import json
+import gzip
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from labs.common.models import Community, Member, Event, Registration
+
+
+EXPORTED_MODELS = [Community, Member, Event, Registration]
+FETCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Stream the lab data out as JSON Lines using server-side cursors'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-o', '--output', dest='output', default='-',
+                            help="Output file, '-' writes to stdout")
+        parser.add_argument('-z', '--gzip', dest='gzip', action='store_true',
+                            default=False, help='Gzip the output file')
+        parser.add_argument('-s', '--fetch-size', dest='fetch_size', type=int,
+                            default=FETCH_SIZE,
+                            help='Rows fetched per server-side cursor round trip')
+        parser.add_argument('-m', '--model', dest='models', action='append',
+                            choices=[m._meta.model_name for m in EXPORTED_MODELS],
+                            help='Model to export, can be repeated (default: all)')
+
+    def handle(self, *args, **options):
+        if options.get('fetch_size') < 1:
+            raise CommandError("The fetch size must be a positive integer")
+        model_names = options.get('models')
+        models = [m for m in EXPORTED_MODELS
+                  if not model_names or m._meta.model_name in model_names]
+        output = options.get('output')
+        if output == '-':
+            if options.get('gzip'):
+                raise CommandError("Gzip output requires an output file")
+            stream = getattr(sys.stdout, 'buffer', sys.stdout)
+        elif options.get('gzip'):
+            stream = gzip.open(output, 'wb')
+        else:
+            stream = io.open(output, 'wb')
+
+        rows = size = 0
+        start = default_timer()
+        try:
+            for model in models:
+                serialized = model.objects.all().iter_serialized(
+                    chunk_size=options.get('fetch_size'), server_side=True)
+                for obj in serialized:
+                    line = json.dumps(obj, cls=DjangoJSONEncoder) + '\n'
+                    line = line.encode('utf-8')
+                    stream.write(line)
+                    rows += 1
+                    size += len(line)
+        finally:
+            if stream is not getattr(sys.stdout, 'buffer', sys.stdout):
+                stream.close()
+        duration = max(default_timer() - start, 1e-6)
+        message = ("{rows} rows ({size:.2f} MB) exported in {time:.2f}s: "
+                   "{rows_rate:.0f} rows/s, {size_rate:.2f} MB/s.")
+        self.output(message.format(
+            rows=rows, size=size / 1e6, time=duration,
+            rows_rate=rows / duration, size_rate=size / 1e6 / duration),
+            style="success")
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stderr.write(style(message))
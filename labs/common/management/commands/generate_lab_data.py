@@ -0,0 +1,103 @@
+from itertools import islice
+from timeit import default_timer
+
+from django.db.models import Max
+from django.core.management.base import BaseCommand, CommandError
+
+from labs.common import generators
+from labs.common.models import Community, Member, Event, Registration
+
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Populate the lab schema with a reproducible synthetic dataset'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--seed', dest='seed', type=int, default=0,
+                            help='Same seed, same dataset (on an empty database)')
+        parser.add_argument('-c', '--communities', dest='communities',
+                            type=int, default=1000)
+        parser.add_argument('-m', '--members', dest='members', type=int,
+                            default=100000)
+        parser.add_argument('-e', '--events', dest='events', type=int,
+                            default=1000)
+        parser.add_argument('-r', '--registrations', dest='registrations',
+                            type=int, default=3,
+                            help='Maximum registrations per member')
+        parser.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+                            default=BATCH_SIZE,
+                            help='Rows inserted per query')
+        parser.add_argument('--copy', dest='copy', action='store_true',
+                            default=False,
+                            help='Load with COPY FROM STDIN instead of bulk_create')
+
+    def handle(self, *args, **options):
+        for option in ('communities', 'members', 'events', 'registrations',
+                       'batch_size'):
+            if options.get(option) < 0:
+                raise CommandError("--{0} must be positive".format(
+                    option.replace('_', '-')))
+        seed = options.get('seed')
+        self.batch_size = options.get('batch_size') or BATCH_SIZE
+        self.copy = options.get('copy')
+
+        last_community = self.last_pk(Community)
+        self.load(Community, generators.communities(
+            options.get('communities'), seed))
+        community_ids = self.new_pks(Community, last_community)
+
+        last_member = self.last_pk(Member)
+        self.load(Member, generators.members(
+            options.get('members'), community_ids, seed))
+
+        last_event = self.last_pk(Event)
+        self.load(Event, generators.events(options.get('events'), seed))
+        event_ids = self.new_pks(Event, last_event)
+
+        members = Member.objects.filter(pk__gt=last_member).order_by('pk')
+        member_ids = members.values_list('pk', flat=True)
+        if self.copy:
+            # no other query can run on the connection while COPY FROM STDIN
+            # streams: read the member ids beforehand
+            member_ids = [pk for chunk in member_ids.keyset_chunks(
+                self.batch_size) for pk in chunk]
+        else:
+            # stream the new member ids instead of loading millions of them
+            member_ids = member_ids.server_side_iterator(self.batch_size)
+        self.load(Registration, generators.registrations(
+            member_ids, event_ids, options.get('registrations'), seed))
+
+    def last_pk(self, model):
+        return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def new_pks(self, model, last_pk):
+        pk_list = model.objects.filter(pk__gt=last_pk).order_by('pk')
+        return list(pk_list.values_list('pk', flat=True))
+
+    def load(self, model, objects):
+        """
+        Inserts the generated objects by batches, only one batch is built
+        in memory at a time, or streams them with COPY.
+        """
+        total = 0
+        start = default_timer()
+        if self.copy:
+            total = model.objects.bulk_copy(objects)
+        else:
+            while True:
+                batch = list(islice(objects, self.batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                total += len(batch)
+        duration = max(default_timer() - start, 1e-6)
+        self.output("{0}: {1} rows in {2:.2f}s ({3:.0f} rows/s)".format(
+            model._meta.verbose_name_plural, total, duration,
+            total / duration), style="success")
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
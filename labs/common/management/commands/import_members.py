@@ -0,0 +1,75 @@
+import io
+import json
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from labs.common.ingestion import ingest_members, BATCH_SIZE
+
+
+def read_json_lines(path):
+    opener = gzip.open if path.endswith('.gz') else io.open
+    with opener(path, 'rb') as data:
+        for line in data:
+            line = line.strip()
+            if line:
+                yield json.loads(line.decode('utf-8'))
+
+
+class LazyFile(object):
+    """
+    Write-only file created on the first write.
+    """
+
+    def __init__(self, path, mode='w'):
+        self.path = path
+        self.mode = mode
+        self.file = None
+
+    def write(self, data):
+        if self.file is None:
+            self.file = open(self.path, self.mode)
+        self.file.write(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class Command(BaseCommand):
+    help = 'Validate and bulk insert members from a JSON Lines file'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('source', help='JSON Lines file (.gz supported)')
+        parser.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+                            default=BATCH_SIZE,
+                            help='Rows validated and inserted per batch')
+        parser.add_argument('-r', '--rejects', dest='rejects',
+                            help='Rejected rows file (default: <source>.rejects)')
+
+    def handle(self, *args, **options):
+        if options.get('batch_size') < 1:
+            raise CommandError("The batch size must be a positive integer")
+        source = options.get('source')
+        rejects_path = options.get('rejects') or source + '.rejects'
+        # no rejects file when every row is valid
+        rejects = LazyFile(rejects_path)
+        try:
+            report = ingest_members(read_json_lines(source),
+                                    batch_size=options.get('batch_size'),
+                                    rejects=rejects)
+        finally:
+            rejects.close()
+        message = ("{r.inserted}/{r.total} members inserted in "
+                   "{r.duration:.2f}s ({rate:.0f} rows/s), {r.rejected} "
+                   "rejected.")
+        self.output(message.format(r=report, rate=report.rows_per_second),
+                    style="success")
+        if report.rejected:
+            self.output("Rejected rows written to {0}".format(rejects_path),
+                        style="warning")
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
@@ -0,0 +1,19 @@
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+
+from labs.common.models import EventSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trigger maintained event sales summaries'
+
+    def handle(self, *args, **options):
+        start = default_timer()
+        count = EventSummary.objects.rebuild()
+        self.output("{0} event summaries rebuilt in {1:.2f}s".format(
+            count, default_timer() - start), style="success")
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
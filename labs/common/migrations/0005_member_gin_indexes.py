@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from labs.common.operations import RunSQLConcurrently
+
+
+class Migration(migrations.Migration):
+    """
+    GIN indexes for the postgres lab lookups on Member:
+
+    - skills: @> (contains), <@ (contained_by) and && (overlap).
+    - info: ? (has_key), ?| / ?& (has_any_keys / has_keys) and @>.
+    - info -> 'languages': jsonb_path_ops only supports @> but is smaller
+      and faster than the default jsonb_ops for containment.
+    - contact: hstore @>, ? and ?| / ?&.
+
+    The indexes are built CONCURRENTLY, without locking the table against
+    writes, outside of a transaction: see `RunSQLConcurrently`.
+    """
+    atomic = False
+
+    dependencies = [
+        ('common', '0004_event_ticket_price'),
+    ]
+
+    operations = [
+        RunSQLConcurrently(
+            'CREATE INDEX CONCURRENTLY common_member_skills_gin '
+            'ON common_member USING gin (skills);',
+            'DROP INDEX CONCURRENTLY common_member_skills_gin;'
+        ),
+        RunSQLConcurrently(
+            'CREATE INDEX CONCURRENTLY common_member_info_gin '
+            'ON common_member USING gin (info);',
+            'DROP INDEX CONCURRENTLY common_member_info_gin;'
+        ),
+        RunSQLConcurrently(
+            'CREATE INDEX CONCURRENTLY common_member_info_languages_gin '
+            'ON common_member USING gin ((info -> \'languages\') jsonb_path_ops);',
+            'DROP INDEX CONCURRENTLY common_member_info_languages_gin;'
+        ),
+        RunSQLConcurrently(
+            'CREATE INDEX CONCURRENTLY common_member_contact_gin '
+            'ON common_member USING gin (contact);',
+            'DROP INDEX CONCURRENTLY common_member_contact_gin;'
+        ),
+    ]
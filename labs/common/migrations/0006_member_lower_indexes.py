@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+LOWER_ARRAY = """
+CREATE OR REPLACE FUNCTION lab_lower_array(varchar[]) RETURNS text[] AS $$
+    SELECT coalesce(array_agg(lower(value)), '{}')
+    FROM unnest($1) AS value
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+LANGUAGE_NAMES = """
+CREATE OR REPLACE FUNCTION lab_language_names(jsonb) RETURNS text[] AS $$
+    SELECT coalesce(array_agg(lower(language ->> 'name')), '{}')
+    FROM jsonb_array_elements(
+        CASE jsonb_typeof($1 -> 'languages')
+            WHEN 'array' THEN $1 -> 'languages'
+            ELSE '[]'::jsonb
+        END
+    ) AS language
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+
+class Migration(migrations.Migration):
+    """
+    Lower-cased search representation of Member skills and languages,
+    used by the `icontains_any` and `language_iexact` lookups:
+
+    - lab_lower_array(skills): GIN index for case-insensitive &&.
+    - lab_language_names(info): GIN index on the lower-cased
+      info.languages[*].name, for case-insensitive @>.
+    - upper(skills[1]::text): btree index matching the SQL generated by
+      Django for `skills__0__iexact`.
+    """
+
+    dependencies = [
+        ('common', '0005_member_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            LOWER_ARRAY,
+            'DROP FUNCTION lab_lower_array(varchar[]);'
+        ),
+        migrations.RunSQL(
+            LANGUAGE_NAMES,
+            'DROP FUNCTION lab_language_names(jsonb);'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX common_member_skills_lower_gin '
+            'ON common_member USING gin (lab_lower_array(skills));',
+            'DROP INDEX common_member_skills_lower_gin;'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX common_member_language_names_gin '
+            'ON common_member USING gin (lab_language_names(info));',
+            'DROP INDEX common_member_language_names_gin;'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX common_member_first_skill_upper '
+            'ON common_member (upper(skills[1]::text));',
+            'DROP INDEX common_member_first_skill_upper;'
+        ),
+    ]
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+APPLY_FUNCTION = """
+CREATE OR REPLACE FUNCTION common_eventsummary_apply(
+    p_event_id integer, p_sign integer, p_ticket integer, p_discount integer
+) RETURNS void AS $$
+DECLARE
+    v_price integer;
+BEGIN
+    -- shared by the registrations of the event, exclusive for a
+    -- ticket_price change: see common_event_summary()
+    PERFORM pg_advisory_xact_lock_shared(
+        'common_event'::regclass::oid::integer, p_event_id);
+    SELECT ticket_price INTO v_price FROM common_event WHERE id = p_event_id;
+    INSERT INTO common_eventsummary AS summary
+        (event_id, registrations, tickets, income, discount_total,
+         max_discount)
+    VALUES (
+        p_event_id, p_sign, p_sign * p_ticket,
+        p_sign * coalesce(
+            p_ticket::bigint * (100 - p_discount) * v_price / 100, 0),
+        p_sign * p_discount,
+        CASE WHEN p_sign > 0 THEN p_discount END
+    )
+    ON CONFLICT (event_id) DO UPDATE SET
+        registrations = summary.registrations + EXCLUDED.registrations,
+        tickets = summary.tickets + EXCLUDED.tickets,
+        income = summary.income + EXCLUDED.income,
+        discount_total = summary.discount_total + EXCLUDED.discount_total,
+        max_discount = CASE
+            WHEN p_sign > 0
+                THEN greatest(summary.max_discount, EXCLUDED.max_discount)
+            WHEN p_discount < summary.max_discount
+                THEN summary.max_discount
+            -- the highest discount was removed, find the next one
+            ELSE (SELECT max(r.discount) FROM common_registration r
+                  WHERE r.event_id = p_event_id)
+        END;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+REGISTRATION_TRIGGER = """
+CREATE OR REPLACE FUNCTION common_registration_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM common_eventsummary_apply(
+            OLD.event_id, -1, OLD.ticket, OLD.discount);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM common_eventsummary_apply(
+            NEW.event_id, 1, NEW.ticket, NEW.discount);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER common_registration_summary
+AFTER INSERT OR DELETE OR UPDATE OF event_id, ticket, discount
+ON common_registration
+FOR EACH ROW EXECUTE PROCEDURE common_registration_summary();
+"""
+
+EVENT_TRIGGER = """
+CREATE OR REPLACE FUNCTION common_event_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM common_eventsummary WHERE event_id = OLD.id;
+    ELSE
+        -- waits for the registrations applied at the old price to commit,
+        -- the ones waiting for the lock read the new price. Each statement
+        -- of the function takes a new snapshot: the recomputed income
+        -- includes the registrations committed meanwhile.
+        PERFORM pg_advisory_xact_lock(
+            'common_event'::regclass::oid::integer, NEW.id);
+        UPDATE common_eventsummary SET income = (
+            SELECT coalesce(sum(
+                r.ticket::bigint * (100 - r.discount) * NEW.ticket_price / 100
+            ), 0)
+            FROM common_registration r WHERE r.event_id = NEW.id
+        ) WHERE event_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER common_event_summary_price
+AFTER UPDATE OF ticket_price ON common_event
+FOR EACH ROW WHEN (OLD.ticket_price IS DISTINCT FROM NEW.ticket_price)
+EXECUTE PROCEDURE common_event_summary();
+
+CREATE TRIGGER common_event_summary_delete
+AFTER DELETE ON common_event
+FOR EACH ROW EXECUTE PROCEDURE common_event_summary();
+"""
+
+FILL = """
+INSERT INTO common_eventsummary (event_id, registrations, tickets, income,
+                                 discount_total, max_discount)
+SELECT r.event_id, count(*), sum(r.ticket),
+       coalesce(sum(r.ticket::bigint * (100 - r.discount)
+                    * e.ticket_price / 100), 0),
+       sum(r.discount), max(r.discount)
+FROM common_registration r INNER JOIN common_event e ON (r.event_id = e.id)
+GROUP BY r.event_id;
+"""
+
+
+class Migration(migrations.Migration):
+    """
+    Per-event sales summary kept up to date by triggers:
+
+    - registration insert/update/delete apply their delta to the summary
+      row of the event, the max discount is only recomputed when the
+      highest discount is removed.
+    - an event ticket_price change recomputes the income of that event,
+      an event deletion removes its summary.
+
+    The registrations of an event share a transaction-level advisory lock
+    that a ticket_price change takes exclusively, so a concurrent
+    registration is neither missed nor counted twice by the recomputed
+    income. The price change waits for the registrations in progress, and
+    a transaction registering to an event then changing its price can
+    deadlock with another one doing the same. Rows written with the
+    triggers disabled (e.g. session_replication_role = replica) are not
+    summarized: `EventSummary.objects.rebuild()` recomputes everything.
+    """
+
+    dependencies = [
+        ('common', '0006_member_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSummary',
+            fields=[
+                ('event', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='summary', serialize=False, to='common.Event')),
+                ('registrations', models.IntegerField(default=0)),
+                ('tickets', models.BigIntegerField(default=0)),
+                ('income', models.BigIntegerField(default=0)),
+                ('discount_total', models.BigIntegerField(default=0)),
+                ('max_discount', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Event summaries',
+            },
+        ),
+        migrations.RunSQL(
+            APPLY_FUNCTION,
+            'DROP FUNCTION common_eventsummary_apply(integer, integer, '
+            'integer, integer);'
+        ),
+        migrations.RunSQL(
+            REGISTRATION_TRIGGER,
+            'DROP TRIGGER common_registration_summary ON common_registration;'
+            'DROP FUNCTION common_registration_summary();'
+        ),
+        migrations.RunSQL(
+            EVENT_TRIGGER,
+            'DROP TRIGGER common_event_summary_price ON common_event;'
+            'DROP TRIGGER common_event_summary_delete ON common_event;'
+            'DROP FUNCTION common_event_summary();'
+        ),
+        migrations.RunSQL(FILL, migrations.RunSQL.noop),
+    ]
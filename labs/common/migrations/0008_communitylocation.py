@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+LOCATIONS_TRIGGER = """
+CREATE OR REPLACE FUNCTION common_community_locations() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM common_communitylocation WHERE community_id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.locations IS NOT NULL THEN
+        INSERT INTO common_communitylocation (community_id, latitude, longitude)
+        SELECT NEW.id, NEW.locations[i][1], NEW.locations[i][2]
+        FROM generate_subscripts(NEW.locations, 1) AS i
+        WHERE NEW.locations[i][1] IS NOT NULL
+          AND NEW.locations[i][2] IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER common_community_locations
+AFTER INSERT OR DELETE OR UPDATE OF locations ON common_community
+FOR EACH ROW EXECUTE PROCEDURE common_community_locations();
+"""
+
+FILL = """
+INSERT INTO common_communitylocation (community_id, latitude, longitude)
+SELECT c.id, c.locations[i][1], c.locations[i][2]
+FROM common_community c, generate_subscripts(c.locations, 1) AS i
+WHERE c.locations[i][1] IS NOT NULL AND c.locations[i][2] IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+    """
+    One row per [latitude, longitude] pair of Community.locations, kept in
+    sync by a trigger, with a GiST index on the earthdistance position for
+    the `within` / `nearest` proximity queries.
+
+    The cube and earthdistance extensions require a superuser, like hstore.
+    """
+
+    dependencies = [
+        ('common', '0007_eventsummary'),
+    ]
+
+    operations = [
+        CreateExtension('cube'),
+        CreateExtension('earthdistance'),
+        migrations.CreateModel(
+            name='CommunityLocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('community', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='points', to='common.Community')),
+            ],
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX common_communitylocation_earth '
+            'ON common_communitylocation '
+            'USING gist (ll_to_earth(latitude, longitude));',
+            'DROP INDEX common_communitylocation_earth;'
+        ),
+        migrations.RunSQL(
+            LOCATIONS_TRIGGER,
+            'DROP TRIGGER common_community_locations ON common_community;'
+            'DROP FUNCTION common_community_locations();'
+        ),
+        migrations.RunSQL(FILL, migrations.RunSQL.noop),
+    ]
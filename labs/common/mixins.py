@@ -1,24 +1,94 @@
 import json
 from functools import partial
+from collections import OrderedDict
 
 from django.core import serializers
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils.encoding import force_text
+
+from .cache import invalidate_deleted
+from .serialization import serialize_instance
 
 
 JSONSerializer = partial(serializers.serialize, 'json')
 
+FOREIGN_KEY_TYPES = ('ForeignKey', 'OneToOneField')
+
+
+class FieldMetadata(object):
+    """
+    Field introspection of a model computed once and shared by all
+    of its instances.
+    """
+
+    def __init__(self, model):
+        self.label = force_text(model._meta)
+        all_fields = model._meta.get_fields()
+        self.concrete_fields = OrderedDict(
+            (f.attname, f) for f in all_fields if f.concrete)
+        self.field_types = OrderedDict(
+            (name, f.get_internal_type())
+            for name, f in self.concrete_fields.items())
+        # accessor name -> attname of concrete ForeignKey/OneToOneField
+        self.foreign_keys = OrderedDict(
+            (name[:-3], name)
+            for name, field_type in self.field_types.items()
+            if field_type in FOREIGN_KEY_TYPES)
+        self.one_to_one_fields = list()
+        self.non_concrete_one_to_one = list()
+        for f in all_fields:
+            if f.one_to_one:
+                if f.concrete:
+                    self.one_to_one_fields.append(f.attname[:-3])
+                    continue
+                self.one_to_one_fields.append(f.get_accessor_name())
+                self.non_concrete_one_to_one.append(f.get_accessor_name())
+        # (name, attname, field) in the order used by the django serializers
+        self.serialized_fields = [
+            (f.name, f.attname, f) for f in model._meta.local_fields
+            if f.serialize]
+        self.serialized_m2m_fields = [
+            f.name for f in model._meta.many_to_many
+            if f.serialize and f.remote_field.through._meta.auto_created]
+
+
+class InvalidationMixin(object):
+    """
+    Invalidates the cached querysets reading the deleted rows, cascades
+    included, `post_delete` isn't used to keep the fast deletes.
+    """
+
+    def delete(self, using=None, keep_parents=False):
+        deleted, rows_count = super(InvalidationMixin, self).delete(
+            using, keep_parents)
+        invalidate_deleted(rows_count, using=using or self._state.db)
+        return deleted, rows_count
+
 
 class SerializationMixin(object):
 
     excluded_fields = []
 
+    # model -> FieldMetadata, filled by `field_metadata()`
+    _field_registry = {}
+
+    @classmethod
+    def field_metadata(cls):
+        # deferred querysets instantiate dynamic subclasses,
+        # they share the metadata of the concrete model.
+        model = cls._meta.concrete_model
+        try:
+            return cls._field_registry[model]
+        except KeyError:
+            metadata = cls._field_registry[model] = FieldMetadata(model)
+            return metadata
+
     @property
     def model_name(self):
         return self._meta.model_name
 
     def _get_concrete_fields(self):
-        all_fields = self._meta.get_fields()
-        return {f.attname: f for f in all_fields if f.concrete}
+        return self.field_metadata().concrete_fields
 
     def _is_concrete_field(self, field_name):
         return field_name in self.field_name_list
@@ -31,12 +101,10 @@ class SerializationMixin(object):
         return field_value
 
     def _get_field_object(self, field_name):
-        fields_info = self._get_concrete_fields()
-        return fields_info[field_name]
+        return self.field_metadata().concrete_fields[field_name]
 
     def _get_field_type(self, field_name):
-        field_obj = self._get_field_object(field_name)
-        return field_obj.get_internal_type()
+        return self.field_metadata().field_types[field_name]
 
     def _is_foreign_key(self, field_name, one2one=True):
         foreign_key_types = ['ForeignKey']
@@ -49,34 +117,22 @@ class SerializationMixin(object):
         return field_name in self._one_to_one_fields()
 
     def _one_to_one_fields(self):
-        all_fields = self._meta.get_fields()
-        fields_list = list()
-        push = fields_list.append
-        for f in all_fields:
-            if f.one_to_one:
-                if f.concrete:
-                    push(f.attname[:-3])
-                    continue
-                push(f.get_accessor_name())
-        return fields_list
+        return list(self.field_metadata().one_to_one_fields)
 
     def _non_concrete_one_to_one(self):
-        all_fields = self._meta.get_fields()
-        fields_list = list()
-        push = fields_list.append
-        for f in all_fields:
-            if f.one_to_one and not f.concrete:
-                push(f.get_accessor_name())
-        return fields_list
+        return list(self.field_metadata().non_concrete_one_to_one)
 
     def foreignkey_list(self, one2one=True, non_concrete=False):
         field_list = list()
         push = field_list.append
-        for field_name in self.field_name_list:
-            if self._is_foreign_key(field_name, one2one):
-                foreign_field = field_name[:-3]
-                if foreign_field not in self.excluded_fields:
-                    push(field_name[:-3])
+        foreign_keys = self.field_metadata().foreign_keys
+        for foreign_field, field_name in foreign_keys.items():
+            if field_name in self.excluded_fields:
+                continue
+            if not self._is_foreign_key(field_name, one2one):
+                continue
+            if foreign_field not in self.excluded_fields:
+                push(foreign_field)
         if non_concrete:
             field_list.extend(self._non_concrete_one_to_one())
         return field_list
@@ -88,16 +144,23 @@ class SerializationMixin(object):
             return f not in self.excluded_fields
 
         concrete_fields_dict = self._get_concrete_fields()
-        return filter(not_excluded, concrete_fields_dict.keys())
+        return list(filter(not_excluded, concrete_fields_dict.keys()))
 
     def to_dict(self):
         data = self.serialize()
         return data[0]['fields']
 
     def serialize(self):
+        return [serialize_instance(self, self.excluded_fields)]
+
+    def json_serialize(self):
+        """
+        Same output as `serialize()` computed through the django JSON
+        serializer, kept as a reference for the native engine.
+        """
         data = JSONSerializer([self])
         json_data = json.loads(data)
-        for field in json_data[0]['fields'].keys():
+        for field in list(json_data[0]['fields'].keys()):
             if field in self.excluded_fields:
                 del json_data[0]['fields'][field]
         return json_data
@@ -116,4 +179,3 @@ class SerializationMixin(object):
                 #    relation and has not `.to_full_dict` attribute
                 continue
         return data
-
@@ -6,13 +6,16 @@ from django.core.validators import MaxValueValidator
 from django.contrib.postgres.fields import ArrayField, HStoreField
 from django.contrib.postgres.fields.jsonb import JSONField
 
-from .mixins import SerializationMixin
+from . import lookups  # noqa: registers the case-insensitive lookups
+from .mixins import InvalidationMixin, SerializationMixin
+from .querysets import (CommunityQuerySet, MemberQuerySet, EventQuerySet,
+                        RegistrationQuerySet, EventSummaryQuerySet)
 from .settings import DATE_PATTERN
 from .validators import (location_schema_validator, info_schema_validator,
                          skills_schema_validator)
 
 
-class Community(SerializationMixin, models.Model):
+class Community(InvalidationMixin, SerializationMixin, models.Model):
     name = models.CharField(max_length=20)
     locations = ArrayField(
         ArrayField(models.FloatField(default=0.0), size=2),
@@ -21,6 +24,8 @@ class Community(SerializationMixin, models.Model):
         validators=[location_schema_validator],
     )
 
+    objects = CommunityQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -28,7 +33,24 @@ class Community(SerializationMixin, models.Model):
         verbose_name_plural = 'Communities'
 
 
-class Member(SerializationMixin, models.Model):
+class CommunityLocation(models.Model):
+    """
+    A [latitude, longitude] pair of `Community.locations`, maintained by
+    the trigger of migration 0008 for the proximity queries: never save
+    it from Django.
+    """
+    community = models.ForeignKey("Community", related_name="points",
+                                  on_delete=models.DO_NOTHING,
+                                  db_constraint=False)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return "{0}: {1}, {2}".format(self.community_id, self.latitude,
+                                      self.longitude)
+
+
+class Member(InvalidationMixin, SerializationMixin, models.Model):
     first_name = models.CharField(max_length=20)
     last_name = models.CharField(max_length=20)
     email = models.EmailField(blank=True, null=True)
@@ -50,11 +72,13 @@ class Member(SerializationMixin, models.Model):
     )
     contact = HStoreField(blank=True, null=True)
 
+    objects = MemberQuerySet.as_manager()
+
     def __str__(self):
         return "{0} {1}".format(self.first_name, self.last_name)
 
 
-class Event(SerializationMixin, models.Model):
+class Event(InvalidationMixin, SerializationMixin, models.Model):
     name = models.CharField(max_length=20)
     start = models.DateTimeField()
     end = models.DateTimeField()
@@ -62,6 +86,8 @@ class Event(SerializationMixin, models.Model):
     ticket_price = models.IntegerField(blank=True, null=True)
     seat_number = models.IntegerField(blank=True, null=True)
 
+    objects = EventQuerySet.as_manager()
+
     @property
     def start_date(self):
         return DATE_PATTERN.format(self.start)
@@ -74,7 +100,7 @@ class Event(SerializationMixin, models.Model):
         return self.name
 
 
-class Registration(SerializationMixin, models.Model):
+class Registration(InvalidationMixin, SerializationMixin, models.Model):
     member = models.ForeignKey("Member", related_name="registrations",
                                on_delete=models.CASCADE)
     event = models.ForeignKey("Event", related_name="registrations",
@@ -85,6 +111,8 @@ class Registration(SerializationMixin, models.Model):
         validators=[MaxValueValidator(100)], default=0)
     registered_on = models.DateTimeField(default=timezone.now)
 
+    objects = RegistrationQuerySet.as_manager()
+
     def __str__(self):
         return '{member} / {event}'.format(
             member=self.member.first_name,
@@ -93,3 +121,35 @@ class Registration(SerializationMixin, models.Model):
 
     class Meta:
         unique_together = ('member', 'event')
+
+
+class EventSummary(models.Model):
+    """
+    Sales figures of an event, maintained by the registration and event
+    triggers of migration 0007: never save it from Django, use
+    `EventSummary.objects.rebuild()` if it ever drifts.
+    """
+    event = models.OneToOneField("Event", primary_key=True,
+                                 related_name="summary",
+                                 on_delete=models.DO_NOTHING,
+                                 db_constraint=False)
+    registrations = models.IntegerField(default=0)
+    tickets = models.BigIntegerField(default=0)
+    income = models.BigIntegerField(default=0)
+    discount_total = models.BigIntegerField(default=0)
+    max_discount = models.IntegerField(blank=True, null=True)
+
+    objects = EventSummaryQuerySet.as_manager()
+
+    @property
+    def average_discount(self):
+        if not self.registrations:
+            return None
+        return float(self.discount_total) / self.registrations
+
+    def __str__(self):
+        return "{0}: {1} tickets, {2}$".format(self.event_id, self.tickets,
+                                               self.income)
+
+    class Meta:
+        verbose_name_plural = 'Event summaries'
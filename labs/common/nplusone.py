@@ -0,0 +1,229 @@
+"""
+N+1 query detection.
+
+Queries are normalized into fingerprints (literals and placeholders
+replaced by `?`, IN lists collapsed) so the same query run for every row
+of a loop is recognized, e.g. the `*_non_optimised` functions of
+`labs.queryset.related_objects`. Any fingerprint repeated more than
+`threshold` times is reported with the calling stack and a suggested
+`select_related`/`prefetch_related` path.
+"""
+import os
+import re
+import logging
+import traceback
+from functools import wraps
+from collections import OrderedDict, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .instrumentation import QueryRecorder
+
+
+THRESHOLD = 5
+
+logger = logging.getLogger('labs.nplusone')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?(?![\w\"])")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\bIN \((?:\?(?:, )?)+\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_FROM = re.compile(r'\bFROM "(\w+)"', re.IGNORECASE)
+_WHERE = re.compile(r'\bWHERE \(?"(\w+)"\."(\w+)" (?:= \?|IN \(\.\.\.\))',
+                    re.IGNORECASE)
+
+DJANGO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(
+    __import__('django').__file__)))
+LABS_COMMON_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def fingerprint(sql):
+    """
+    >>> fingerprint('SELECT ... FROM "common_community" WHERE "common_community"."id" = %s')
+    'SELECT ... FROM "common_community" WHERE "common_community"."id" = ?'
+    """
+    sql = _SPACES.sub(' ', sql.strip())
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _models_by_table():
+    return dict((m._meta.db_table, m) for m in apps.get_models())
+
+
+def suggest(sql_fingerprint):
+    """
+    Guesses the relation that would have avoided the repeated query from
+    the table and column it filters on:
+
+    - filtering a table on its primary key means a ForeignKey was
+      followed for each row: `select_related` it.
+    - filtering a table on a ForeignKey column means a reverse or
+      many-to-many relation was read for each row: `prefetch_related` it.
+    """
+    where = _WHERE.search(sql_fingerprint)
+    if where is None:
+        return None
+    models = _models_by_table()
+    model = models.get(where.group(1))
+    if model is None:
+        return None
+    column = where.group(2)
+    suggestions = list()
+    if column == model._meta.pk.column:
+        for related_model in models.values():
+            for field in related_model._meta.concrete_fields:
+                if (field.many_to_one or field.one_to_one) \
+                        and field.remote_field.model is model:
+                    suggestions.append("{0}.objects.select_related('{1}')".format(
+                        related_model.__name__, field.name))
+        return ' or '.join(suggestions) or None
+    for field in model._meta.concrete_fields:
+        if field.column != column or not field.is_relation:
+            continue
+        target = field.remote_field.model
+        # table queried as the `through` of a many-to-many relation
+        table = _FROM.search(sql_fingerprint)
+        if table and table.group(1) != model._meta.db_table:
+            for m2m in target._meta.many_to_many:
+                if m2m.remote_field.through is model:
+                    suggestions.append(
+                        "{0}.objects.prefetch_related('{1}')".format(
+                            target.__name__, m2m.name))
+        suggestions.append("{0}.objects.prefetch_related('{1}')".format(
+            target.__name__, field.remote_field.get_accessor_name()))
+    return ' or '.join(suggestions) or None
+
+
+def project_stack(stack):
+    """
+    Keeps the frames of the calling code, out of django and this package
+    instrumentation.
+    """
+    return [frame for frame in stack or []
+            if not frame[0].startswith(DJANGO_PATH)
+            and not frame[0].startswith(LABS_COMMON_PATH)]
+
+
+class NPlusOne(namedtuple('NPlusOne',
+                          ['fingerprint', 'count', 'stack', 'suggestion'])):
+
+    def __str__(self):
+        lines = ["[N+1] : {0} x {1}".format(self.count, self.fingerprint)]
+        if self.suggestion:
+            lines.append("  suggestion: {0}".format(self.suggestion))
+        lines.extend(traceback.format_list(self.stack[-3:]))
+        return '\n'.join(line.rstrip() for line in lines)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class NPlusOneDetector(object):
+    """
+    Context manager reporting the fingerprints repeated more than
+    `threshold` times in the block:
+
+    >>> with NPlusOneDetector(threshold=5) as detector:
+    ...     community_per_member_non_optimised()
+    >>> detector.duplicates
+    [NPlusOne(fingerprint='SELECT ... WHERE "common_community"."id" = ?',
+              count=2000, stack=[...],
+              suggestion="Member.objects.select_related('community')")]
+
+    With `raise_exception`, leaving the block raises `NPlusOneError`,
+    which makes it usable as an assertion in tests.
+    """
+
+    def __init__(self, threshold=None, using=DEFAULT_DB_ALIAS,
+                 raise_exception=False):
+        if threshold is None:
+            threshold = getattr(settings, 'NPLUSONE_THRESHOLD', THRESHOLD)
+        self.threshold = threshold
+        self.raise_exception = raise_exception
+        self.recorder = QueryRecorder(using, capture_stack=True)
+        self.duplicates = list()
+
+    def __enter__(self):
+        self.recorder.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.recorder.__exit__(exc_type, exc_value, tb)
+        self.duplicates = self.analyze(self.recorder.statistics.queries)
+        for duplicate in self.duplicates:
+            logger.warning(str(duplicate))
+        if self.duplicates and self.raise_exception and exc_type is None:
+            raise NPlusOneError('\n'.join(str(d) for d in self.duplicates))
+
+    def analyze(self, queries):
+        groups = OrderedDict()
+        for query in queries:
+            groups.setdefault(fingerprint(query.sql), []).append(query)
+        duplicates = list()
+        for sql_fingerprint, group in groups.items():
+            if len(group) > self.threshold:
+                duplicates.append(NPlusOne(
+                    sql_fingerprint, len(group), project_stack(group[0].stack),
+                    suggest(sql_fingerprint)))
+        return duplicates
+
+
+def detect_n_plus_one(func=None, threshold=None, raise_exception=False):
+    """
+    Decorator version of `NPlusOneDetector`, usable with or without
+    arguments like `query_statistic`:
+
+    >>> @detect_n_plus_one(threshold=10, raise_exception=True)
+    ... def community_per_member_non_optimised(): ...
+
+    The queries repeated more than `threshold` times (NPLUSONE_THRESHOLD
+    by default) are logged on `labs.nplusone`, printed and kept on
+    `wrapper.duplicates`. With `raise_exception` the call raises
+    `NPlusOneError` instead of returning, nothing is printed.
+    """
+    def decorator(func):
+        @wraps(func)
+        def func_wrapper(*args, **kwargs):
+            detector = NPlusOneDetector(threshold,
+                                        raise_exception=raise_exception)
+            with detector:
+                result = func(*args, **kwargs)
+            func_wrapper.duplicates = detector.duplicates
+            for duplicate in detector.duplicates:
+                print(duplicate)
+            return result
+        func_wrapper.duplicates = list()
+        return func_wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+class NPlusOneMiddleware(object):
+    """
+    Logs the N+1 queries of every request on the `labs.nplusone` logger.
+    """
+
+    def process_request(self, request):
+        request._nplusone_detector = NPlusOneDetector()
+        request._nplusone_detector.__enter__()
+
+    def _stop(self, request):
+        detector = getattr(request, '_nplusone_detector', None)
+        if detector is not None:
+            del request._nplusone_detector
+            detector.__exit__(None, None, None)
+
+    def process_exception(self, request, exception):
+        self._stop(request)
+
+    def process_response(self, request, response):
+        self._stop(request)
+        return response
@@ -0,0 +1,23 @@
+from django.db import migrations, transaction
+
+
+class RunSQLConcurrently(migrations.RunSQL):
+    """
+    `RunSQL` for the statements which can't run inside a transaction,
+    e.g. CREATE INDEX CONCURRENTLY: the migration transaction is committed,
+    they run in autocommit then a new transaction is opened for the next
+    operations. Django 1.9 ignores `Migration.atomic = False` and always
+    wraps a postgres migration in a transaction.
+    """
+
+    def _run_sql(self, schema_editor, sqls):
+        connection = schema_editor.connection
+        if schema_editor.collect_sql or not connection.in_atomic_block:
+            return super(RunSQLConcurrently, self)._run_sql(schema_editor,
+                                                            sqls)
+        schema_editor.atomic.__exit__(None, None, None)
+        try:
+            super(RunSQLConcurrently, self)._run_sql(schema_editor, sqls)
+        finally:
+            schema_editor.atomic = transaction.atomic(connection.alias)
+            schema_editor.atomic.__enter__()
@@ -0,0 +1,180 @@
+"""
+PostgreSQL COPY loader.
+
+`bulk_create` still sends one multi-row INSERT per batch, `COPY FROM STDIN`
+streams the rows in the COPY text format instead, which is the fastest
+way to load millions of rows. Rows (model instances or dicts) are encoded
+lazily and pulled by psycopg2 through a buffered file-like object.
+"""
+from __future__ import unicode_literals
+
+import json
+import datetime
+
+from django.db import connections, DEFAULT_DB_ALIAS, models
+from django.contrib.postgres.fields import ArrayField, HStoreField
+from django.contrib.postgres.fields.jsonb import JSONField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
+from django.utils.encoding import force_text
+
+
+BUFFER_SIZE = 64 * 1024
+
+NULL = '\\N'
+
+
+def copy_escape(text):
+    # str.translate(dict) doesn't work on python 2 byte strings
+    return (force_text(text).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _quote(text):
+    return '"{0}"'.format(text.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _scalar(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return force_text(value)
+
+
+def array_literal(values):
+    """
+    >>> array_literal([[48.1, 11.5], [52.5, None]])
+    '{{48.1,11.5},{52.5,NULL}}'
+    """
+    items = list()
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            items.append(array_literal(value))
+        elif isinstance(value, six.string_types):
+            items.append(_quote(value))
+        else:
+            items.append(_scalar(value))
+    return '{' + ','.join(items) + '}'
+
+
+def hstore_literal(mapping):
+    """
+    >>> hstore_literal({'city': 'Berlin', 'phone': None})
+    '"city"=>"Berlin","phone"=>NULL'
+    """
+    return ','.join(
+        '{0}=>{1}'.format(_quote(force_text(key)),
+                          'NULL' if value is None else _quote(force_text(value)))
+        for key, value in mapping.items())
+
+
+def encoder_for(field):
+    """
+    Returns the function encoding a python value of `field` into the
+    COPY text representation (before escaping), always as text.
+    """
+    if isinstance(field, ArrayField):
+        encode = array_literal
+    elif isinstance(field, HStoreField):
+        encode = hstore_literal
+    elif isinstance(field, JSONField):
+        def encode(value):
+            return json.dumps(value, cls=DjangoJSONEncoder)
+    else:
+        encode = _scalar
+    return lambda value: force_text(encode(value))
+
+
+class CopyStream(object):
+    """
+    Read-only file-like object encoding the COPY lines on demand, psycopg2
+    pulls it by chunks of `copy_expert(size=...)` characters, each chunk
+    is encoded to UTF-8 once.
+    """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = ''
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            try:
+                line = next(self.lines)
+            except StopIteration:
+                break
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+        data = ''.join(chunks)
+        if size < 0:
+            self.buffer = ''
+        else:
+            data, self.buffer = data[:size], data[size:]
+        return data.encode('utf-8')
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def copy_columns(model, include_pk=False):
+    return [f for f in model._meta.concrete_fields
+            if include_pk or not isinstance(f, models.AutoField)]
+
+
+def copy_lines(model, rows, fields):
+    """
+    Yields one COPY text line per row. Rows are model instances or
+    dicts keyed by field name or attname, missing keys get the field
+    default.
+    """
+    encoders = [(f, f.attname, encoder_for(f)) for f in fields]
+    for row in rows:
+        values = list()
+        if isinstance(row, dict):
+            for field, attname, encode in encoders:
+                if attname in row:
+                    value = row[attname]
+                elif field.name in row:
+                    value = row[field.name]
+                    if isinstance(value, models.Model):
+                        value = value.pk
+                else:
+                    value = field.get_default()
+                values.append(NULL if value is None
+                              else copy_escape(encode(value)))
+        else:
+            for field, attname, encode in encoders:
+                value = field.pre_save(row, True)
+                values.append(NULL if value is None
+                              else copy_escape(encode(value)))
+        yield '\t'.join(values) + '\n'
+
+
+def copy_from(model, rows, using=DEFAULT_DB_ALIAS, include_pk=False,
+              buffer_size=BUFFER_SIZE):
+    """
+    Loads `rows` into the `model` table with `COPY ... FROM STDIN` and
+    returns the number of copied rows:
+
+    >>> COPY "common_member" ("first_name", "last_name", ...) FROM STDIN
+
+    As with `bulk_create`, `save()` is not called and no signal is sent.
+    """
+    connection = connections[using]
+    fields = copy_columns(model, include_pk)
+    qn = connection.ops.quote_name
+    sql = 'COPY {table} ({columns}) FROM STDIN'.format(
+        table=qn(model._meta.db_table),
+        columns=', '.join(qn(f.column) for f in fields))
+    stream = CopyStream(copy_lines(model, rows, fields))
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, stream, size=buffer_size)
+    return stream.rows
@@ -0,0 +1,835 @@
+import json
+import uuid
+from itertools import islice
+from collections import OrderedDict, namedtuple
+
+from django.db import models, connections, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.db.models.query import (ModelIterable, ValuesIterable,
+                                    FlatValuesListIterable,
+                                    get_related_populators)
+from django.db.models.query_utils import deferred_class_factory
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .cache import cached_results, invalidate_model, invalidate_deleted
+from .decorators import query_guarantee
+from .deletion import chunked_delete, CHUNK_SIZE
+from .instrumentation import QueryRecorder, timed_cursor
+from .pgcopy import copy_from, BUFFER_SIZE
+from .serialization import dump_object, encode_value, serialize_instance
+
+
+DeepSerialization = namedtuple('DeepSerialization', ['objects', 'queries'])
+
+
+class LabQuerySet(models.QuerySet):
+    _cached = False
+    _cache_timeout = DEFAULT_TIMEOUT
+
+    def cached(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Evaluates the queryset from the result cache, keyed by its SQL,
+        its parameters and the generation of the tables it reads, see
+        `labs.common.cache`. Entries expire after `timeout` seconds
+        (the cache backend TIMEOUT by default). prefetch_related lookups
+        still run against the database:
+
+        >>> list(Community.objects.cached(60))  # hits the database
+        >>> list(Community.objects.cached(60))  # doesn't
+        """
+        return self._clone(_cached=True, _cache_timeout=timeout)
+
+    def _clone(self, **kwargs):
+        kwargs.setdefault('_cached', self._cached)
+        kwargs.setdefault('_cache_timeout', self._cache_timeout)
+        return super(LabQuerySet, self)._clone(**kwargs)
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cached:
+            self._result_cache = cached_results(self, self._cache_timeout)
+        super(LabQuerySet, self)._fetch_all()
+
+    def update(self, **kwargs):
+        rows = super(LabQuerySet, self).update(**kwargs)
+        # no post_save is sent
+        invalidate_model(self.model, using=self.db)
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        deleted, rows_count = super(LabQuerySet, self).delete()
+        # no post_delete receiver, it would disable the fast deletes
+        invalidate_deleted(rows_count, using=self.db)
+        return deleted, rows_count
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _raw_delete(self, using):
+        rows = super(LabQuerySet, self)._raw_delete(using)
+        invalidate_model(self.model, using=using)
+        return rows
+
+    def bulk_create(self, objs, batch_size=None):
+        objs = super(LabQuerySet, self).bulk_create(objs, batch_size)
+        # no post_save is sent
+        invalidate_model(self.model, using=self.db)
+        return objs
+
+    def bulk_copy(self, rows, buffer_size=BUFFER_SIZE):
+        """
+        Loads model instances or dicts with `COPY FROM STDIN`, see
+        `labs.common.pgcopy.copy_from`. Returns the number of rows.
+        """
+        count = copy_from(self.model, rows, using=self.db,
+                          buffer_size=buffer_size)
+        invalidate_model(self.model, using=self.db)
+        return count
+
+    def bulk_update_values(self, rows, fields, batch_size=1000):
+        """
+        Updates `fields` with a different value per row (model instances or
+        dicts holding the primary key as `pk` or its attname), sending one
+        statement per batch of `batch_size` rows. Every value is cast to
+        its column type so array, jsonb and hstore values are understood
+        in the VALUES list. The queryset filters restrict the updated
+        rows. Every dict row must hold all of `fields`, a missing one
+        raises ValueError. Returns the number of updated rows:
+
+        >>> UPDATE registration SET discount = v.discount
+            FROM (VALUES (1::integer, 10::integer), (2::integer, 25::integer))
+            AS v (id, discount) WHERE registration.id = v.id
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        pk = opts.pk
+        fields = [opts.get_field(name) for name in fields]
+        table = qn(opts.db_table)
+        placeholder = '({0})'.format(', '.join(
+            '%s::{0}'.format(cast_type(f, connection)) for f in [pk] + fields))
+        sql = ('UPDATE {table} SET {set} FROM (VALUES {values}) '
+               'AS v ({columns}) WHERE {table}.{pk} = v.{pk}')
+        set_sql = ', '.join('{0} = v.{0}'.format(qn(f.column)) for f in fields)
+        columns = ', '.join(qn(f.column) for f in [pk] + fields)
+        where_params = list()
+        if self.query.where:
+            subquery, where_params = self.values('pk').query.sql_with_params()
+            subquery = subquery.replace('{', '{{').replace('}', '}}')
+            sql += ' AND {table}.{pk} IN (' + subquery + ')'
+        updated = 0
+        rows = iter(rows)
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                params = list()
+                for row in batch:
+                    if isinstance(row, dict) and 'pk' in row:
+                        params.append(row['pk'])
+                    else:
+                        params.append(row_value(row, pk, add=False))
+                    params.extend(
+                        f.get_db_prep_save(row_value(row, f, add=False),
+                                           connection)
+                        for f in fields)
+                cursor.execute(sql.format(
+                    table=table, set=set_sql, columns=columns,
+                    pk=qn(pk.column),
+                    values=', '.join([placeholder] * len(batch))),
+                    params + list(where_params))
+                updated += cursor.rowcount
+            invalidate_model(self.model, using=self.db)
+        return updated
+
+    def chunked_delete(self, chunk_size=CHUNK_SIZE, send_signals=False,
+                       callback=None):
+        """
+        Deletes the rows `chunk_size` at a time with planned set-based
+        cascades, one short transaction per chunk, see
+        `labs.common.deletion.chunked_delete`. Returns a `DeleteReport`.
+        """
+        return chunked_delete(self, chunk_size, send_signals, callback)
+
+    def with_related_counts(self, *names):
+        """
+        Annotates `<name>_count` for each reverse foreign key or many to
+        many relation of `names`, counted in the database by a correlated
+        subquery on the indexed foreign key of the related (or through)
+        table. Unlike `annotate(Count(...))` there is no GROUP BY on the
+        selected columns and several counts don't multiply each other, the
+        subqueries only run for the rows actually fetched:
+
+        >>> Member.objects.with_related_counts('events', 'registrations')
+        >>> SELECT member.*,
+            (SELECT COUNT(*) FROM registration related
+             WHERE related.member_id = member.id) AS events_count,
+            (SELECT COUNT(*) FROM registration related
+             WHERE related.member_id = member.id) AS registrations_count
+            FROM member
+        """
+        connection = connections[self.db]
+        annotations = OrderedDict()
+        for name in names:
+            sql = self._count_subquery(name, connection)
+            annotations['{0}_count'.format(name)] = RawSQL(
+                sql, (), output_field=models.IntegerField())
+        clone = self
+        for alias, expression in annotations.items():
+            clone = clone.annotate(**{alias: expression})
+        return clone
+
+    def _count_subquery(self, name, connection):
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        field = opts.get_field(name)
+        if field.many_to_many:
+            if field.auto_created:
+                # reverse side, e.g. Event.attendees
+                m2m = field.field
+                through = m2m.remote_field.through
+                column, target = m2m.m2m_reverse_name(), m2m.target_field
+            else:
+                through = field.remote_field.through
+                column = field.m2m_column_name()
+                target = opts.pk
+            table = through._meta.db_table
+        elif field.one_to_many:
+            table = field.related_model._meta.db_table
+            column, target = field.field.column, field.field.target_field
+        else:
+            raise ValueError("{0}.{1} is not a reverse foreign key or a many "
+                             "to many relation".format(opts.object_name, name))
+        return ('SELECT COUNT(*) FROM {table} related '
+                'WHERE related.{column} = {outer}.{target}'.format(
+                    table=qn(table), column=qn(column),
+                    outer=qn(opts.db_table), target=qn(target.column)))
+
+    def _serialized_fields(self):
+        metadata = self.model.field_metadata()
+        excluded_fields = self.model.excluded_fields
+        fields = [(name, attname, field)
+                  for name, attname, field in metadata.serialized_fields
+                  if name not in excluded_fields]
+        m2m_fields = [name for name in metadata.serialized_m2m_fields
+                      if name not in excluded_fields]
+        return fields, m2m_fields
+
+    def _m2m_values(self, name, pk_list):
+        """
+        Returns {pk: [related pk, ...]} of the `name` m2m for `pk_list`
+        in a single query against the through table.
+        """
+        field = self.model._meta.get_field(name)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        rows = through._default_manager.filter(
+            **{source + '__in': pk_list}).values_list(
+            source + '_id', target + '_id')
+        related = dict((pk, []) for pk in pk_list)
+        for pk, related_pk in rows:
+            related[pk].append(related_pk)
+        return related
+
+    def _named_cursor(self, sql, params, itersize):
+        """
+        Runs `sql` on a PostgreSQL server-side (named) cursor and yields
+        lists of `itersize` rows, so the result set is never loaded at
+        once on the client. The cursor lives in its own transaction until
+        the generator is exhausted or closed.
+        """
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            connection.ensure_connection()
+            cursor_name = 'lab_cursor_{0}'.format(uuid.uuid4().hex)
+            cursor = connection.connection.cursor(name=cursor_name)
+            cursor.itersize = itersize
+            # not created by `connection.cursor()`, the query recorders
+            # would miss it
+            cursor = timed_cursor(connection, cursor)
+            try:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(itersize)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+
+    def server_side_rows(self, fetch_size=2000):
+        """
+        Yields the raw rows of a `values_list()` queryset in lists of
+        `fetch_size` rows read from a server-side cursor.
+        """
+        sql, params = self.query.sql_with_params()
+        return self._named_cursor(sql, params, fetch_size)
+
+    def server_side_iterator(self, itersize=2000):
+        """
+        Same as `iterator()` but reads the rows from a server-side cursor,
+        `itersize` rows per round trip: with psycopg2 `iterator()` still
+        pulls the whole result set into memory. Yields model instances
+        (select_related and annotations included), dicts, tuples or flat
+        values like iterating the queryset would; prefetch_related lookups
+        are not applied.
+
+        >>> for member in Member.objects.server_side_iterator(5000):
+        ...     print(member)
+        """
+        compiler = self.query.get_compiler(using=self.db)
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            return
+        col_count = compiler.col_count
+        batches = ([row[:col_count] for row in rows]
+                   for rows in self._named_cursor(sql, params, itersize))
+        rows = compiler.results_iter(batches)
+        if self._iterable_class is ModelIterable:
+            for obj in self._model_rows(compiler, rows):
+                yield obj
+            return
+        query = self.query
+        names = (list(query.extra_select) + list(query.values_select) +
+                 list(query.annotation_select))
+        if self._iterable_class is FlatValuesListIterable:
+            for row in rows:
+                yield row[0]
+        elif self._iterable_class is ValuesIterable:
+            for row in rows:
+                yield dict(zip(names, row))
+        elif not query.extra_select and not query.annotation_select:
+            for row in rows:
+                yield tuple(row)
+        else:
+            fields = names
+            if self._fields:
+                fields = list(self._fields) + [
+                    f for f in query.annotation_select if f not in self._fields]
+            for row in rows:
+                data = dict(zip(names, row))
+                yield tuple(data[f] for f in fields)
+
+    def _model_rows(self, compiler, rows):
+        """
+        Builds the model instances as `ModelIterable` does.
+        """
+        select = compiler.select
+        klass_info = compiler.klass_info
+        if klass_info is None:
+            return
+        model_cls = klass_info['model']
+        select_fields = klass_info['select_fields']
+        start, end = select_fields[0], select_fields[-1] + 1
+        init_list = [f[0].target.attname for f in select[start:end]]
+        if len(init_list) != len(model_cls._meta.concrete_fields):
+            init_set = set(init_list)
+            skip = [f.attname for f in model_cls._meta.concrete_fields
+                    if f.attname not in init_set]
+            model_cls = deferred_class_factory(model_cls, skip)
+        related_populators = get_related_populators(klass_info, select, self.db)
+        annotation_col_map = compiler.annotation_col_map
+        for row in rows:
+            obj = model_cls.from_db(self.db, init_list, row[start:end])
+            for related_populator in related_populators:
+                related_populator.populate(row, obj)
+            for attr_name, col_pos in (annotation_col_map or {}).items():
+                setattr(obj, attr_name, row[col_pos])
+            yield obj
+
+    def keyset_chunks(self, chunk_size=2000):
+        """
+        Yields the queryset results in lists of `chunk_size` items using
+        keyset pagination on the primary key, each chunk is a cheap index
+        range scan whatever its position in the table:
+
+        >>> SELECT member.id, ... FROM member
+            WHERE member.id > last_id ORDER BY member.id ASC LIMIT 2000
+
+        Works with model instances, `values()` including the primary key,
+        `values_list()` starting with it and `values_list('pk', flat=True)`.
+        """
+        queryset = self.order_by('pk')
+        pk_name = self.model._meta.pk.attname
+        last_pk = None
+        while True:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                break
+            yield rows
+            last = rows[-1]
+            if isinstance(last, models.Model):
+                last_pk = last.pk
+            elif isinstance(last, dict):
+                last_pk = last['pk'] if 'pk' in last else last[pk_name]
+            elif isinstance(last, tuple):
+                last_pk = last[0]
+            else:
+                last_pk = last
+
+    def keyset_iterator(self, chunk_size=2000):
+        """
+        Iterates the queryset by chunks of `chunk_size` rows with keyset
+        pagination on the primary key, see `keyset_chunks()`. Memory stays
+        bounded by one chunk whatever the table size.
+        """
+        for rows in self.keyset_chunks(chunk_size):
+            for row in rows:
+                yield row
+
+    def iter_serialized(self, chunk_size=2000, server_side=False):
+        """
+        Yields the `{model, pk, fields}` structure of each row without
+        building model instances. Rows are fetched with `values_list()`
+        by chunks of `chunk_size`, either with keyset pagination on the
+        primary key or through a server-side cursor, so memory stays flat
+        whatever the table size.
+        """
+        label = self.model.field_metadata().label
+        fields, m2m_fields = self._serialized_fields()
+        columns = ['pk'] + [attname for name, attname, field in fields]
+        queryset = self.order_by('pk').values_list(*columns)
+        if server_side:
+            batches = queryset.server_side_rows(chunk_size)
+        else:
+            batches = queryset.keyset_chunks(chunk_size)
+        for rows in batches:
+            m2m_values = dict(
+                (name, self._m2m_values(name, [row[0] for row in rows]))
+                for name in m2m_fields)
+            for row in rows:
+                data = dict(
+                    (name, encode_value(field, value))
+                    for (name, attname, field), value in zip(fields, row[1:]))
+                for name in m2m_fields:
+                    data[name] = m2m_values[name][row[0]]
+                yield dump_object(label, row[0], data)
+
+    def dump_json(self, stream, chunk_size=2000):
+        """
+        Writes the serialized rows to `stream` as a JSON list, one object
+        at a time. Returns the number of written objects.
+        """
+        count = 0
+        stream.write('[')
+        for count, obj in enumerate(self.iter_serialized(chunk_size), 1):
+            if count > 1:
+                stream.write(', ')
+            stream.write(json.dumps(obj, cls=DjangoJSONEncoder))
+        stream.write(']')
+        return count
+
+    def deep_serialize(self, one2one=True):
+        """
+        Graph-aware version of `SerializationMixin.deep_serialize()`.
+
+        Serializes the queryset objects then every object reachable through
+        their ForeignKey/OneToOneField. Targets are resolved level by level
+        with one `in_bulk()` query per model, each (model, pk) is serialized
+        once, and the objects are returned as a flat list: the queryset
+        objects first, then each level in discovery order.
+
+        >>> Registration.objects.filter(event_id=1).deep_serialize()
+        DeepSerialization(objects=[...], queries=4)
+        """
+        objects = list()
+        # (model, pk) -> one2one flag the object was expanded with
+        seen = dict()
+        with QueryRecorder(using=self.db) as statistics:
+            level = [(obj, one2one) for obj in self]
+            while level:
+                # model -> {pk: one2one flag}
+                pending = OrderedDict()
+                for obj, follow_one2one in level:
+                    key = (obj._meta.concrete_model, obj.pk)
+                    if key not in seen:
+                        objects.append(serialize_instance(
+                            obj, obj.excluded_fields))
+                    elif seen[key] or not follow_one2one:
+                        continue
+                    seen[key] = follow_one2one
+                    metadata = obj.field_metadata()
+                    for field_name in obj.foreignkey_list(follow_one2one):
+                        attname = metadata.foreign_keys[field_name]
+                        pk = getattr(obj, attname)
+                        if pk is None:
+                            continue
+                        field = metadata.concrete_fields[attname]
+                        model = field.remote_field.model._meta.concrete_model
+                        one2one_flag = obj._is_one_to_one_field(field_name)
+                        if seen.get((model, pk)) in (True, one2one_flag):
+                            continue
+                        targets = pending.setdefault(model, OrderedDict())
+                        targets[pk] = targets.get(pk, False) or one2one_flag
+                level = list()
+                for model, targets in pending.items():
+                    related = model._default_manager.using(
+                        self.db).in_bulk(list(targets))
+                    level.extend((related[pk], flag)
+                                 for pk, flag in targets.items()
+                                 if pk in related)
+        return DeepSerialization(objects, statistics.count)
+
+
+UpsertResult = namedtuple('UpsertResult', ['inserted', 'updated', 'unchanged'])
+
+
+def cast_type(field, connection):
+    """
+    Column type to cast a value of `field` to, `serial` is not a type.
+    """
+    if isinstance(field, models.AutoField):
+        return models.IntegerField().db_type(connection)
+    return field.db_type(connection)
+
+
+def row_value(row, field, add=True):
+    """
+    Value of `field` in a model instance or a dict keyed by field name or
+    attname. When missing from a dict, the field default for an insert
+    (`add`), a ValueError for an update.
+    """
+    if not isinstance(row, dict):
+        return field.pre_save(row, add)
+    if field.attname in row:
+        return row[field.attname]
+    if field.name in row:
+        value = row[field.name]
+        return value.pk if isinstance(value, models.Model) else value
+    if not add:
+        raise ValueError("Missing value of {0} in {1!r}".format(
+            field.name, row))
+    return field.get_default()
+
+
+# earthdistance positions of the searched point and of a community location
+EARTH_POINT = 'll_to_earth(%s, %s)'
+EARTH_LOCATION = 'll_to_earth(location.latitude, location.longitude)'
+EARTH_HALF_CIRCUMFERENCE = 20038  # km
+
+
+class CommunityQuerySet(LabQuerySet):
+
+    @query_guarantee(2, touch=lambda community: list(community.members.all()))
+    def with_members(self):
+        """
+        Communities along with their members, in 2 queries:
+
+        >>> SELECT community.* FROM community
+        >>> SELECT member.* FROM member WHERE member.community_id IN (1, 2, 3)
+        """
+        return self.prefetch_related('members')
+
+    @query_guarantee(1, touch=lambda community: community.members_count)
+    def with_member_counts(self):
+        """
+        Communities annotated with `members_count`, in 1 query.
+        """
+        return self.with_related_counts('members')
+
+    @query_guarantee(1, args=(48.8, 2.3, 50))
+    def within(self, latitude, longitude, km):
+        """
+        Communities having a location within `km` kilometers of the point,
+        annotated with the `distance` (km) of their nearest location and
+        ordered by it. The candidate locations come from the GiST index
+        on ll_to_earth(latitude, longitude), the exact great circle
+        distance is only computed for them:
+
+        >>> SELECT community.*, (SELECT min(earth_distance(...)) ...) / 1000 AS distance
+            FROM community WHERE community.id IN (
+                SELECT location.community_id FROM communitylocation location
+                WHERE earth_box(ll_to_earth(48.8, 2.3), 50000)
+                      @> ll_to_earth(location.latitude, location.longitude)
+                AND earth_distance(ll_to_earth(48.8, 2.3),
+                    ll_to_earth(location.latitude, location.longitude)) <= 50000)
+            ORDER BY distance ASC
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        locations = opts.get_field('points').related_model._meta.db_table
+        context = dict(table=qn(opts.db_table), pk=qn(opts.pk.column),
+                       locations=qn(locations), point=EARTH_POINT,
+                       location=EARTH_LOCATION)
+        meters = km * 1000.0
+        where = ('{table}.{pk} IN (SELECT location.community_id '
+                 'FROM {locations} location '
+                 'WHERE earth_box({point}, %s) @> {location} '
+                 'AND earth_distance({point}, {location}) <= %s)'
+                 .format(**context))
+        distance = ('SELECT min(earth_distance({point}, {location})) / 1000 '
+                    'FROM {locations} location '
+                    'WHERE location.community_id = {table}.{pk}'
+                    .format(**context))
+        point = [latitude, longitude]
+        return self.extra(
+            where=[where], params=point + [meters] + point + [meters],
+        ).annotate(distance=RawSQL(
+            distance, point, output_field=models.FloatField(),
+        )).order_by('distance')
+
+    def nearest(self, latitude, longitude, k=10, start_km=10):
+        """
+        The `k` communities nearest to the point, as a `within` queryset.
+        cube can't order by distance from an index before postgres 9.6,
+        the search radius is multiplied by 4 until it holds `k`
+        communities: none outside of it can be nearer than those inside.
+        """
+        km = start_km
+        while True:
+            candidates = self.within(latitude, longitude, km)
+            if km >= EARTH_HALF_CIRCUMFERENCE or candidates.count() >= k:
+                return candidates[:k]
+            km = min(km * 4, EARTH_HALF_CIRCUMFERENCE)
+
+
+class MemberQuerySet(LabQuerySet):
+
+    @query_guarantee(1, touch=lambda member: member.community)
+    def with_community(self):
+        """
+        Members along with their community, in 1 query:
+
+        >>> SELECT member.*, community.* FROM member
+            LEFT OUTER JOIN community ON (member.community_id = community.id)
+        """
+        return self.select_related('community')
+
+    @query_guarantee(2, touch=lambda member: list(member.events.all()))
+    def with_events(self):
+        """
+        Members along with the events they registered to, in 2 queries.
+        """
+        return self.prefetch_related('events')
+
+    @query_guarantee(1, touch=lambda member: member.events_count)
+    def with_event_counts(self):
+        """
+        Members annotated with `events_count`, in 1 query.
+        """
+        return self.with_related_counts('events')
+
+    @query_guarantee(1, args=('Python', 'Django'))
+    def with_any_skill(self, *skills):
+        """
+        Members having at least one of `skills` whatever their casing, in
+        1 query using the lab_lower_array(skills) GIN index.
+        """
+        return self.filter(skills__icontains_any=list(skills))
+
+    @query_guarantee(1, args=('French',))
+    def speaking(self, language):
+        """
+        Members speaking `language` whatever its casing, in 1 query using
+        the lab_language_names(info) GIN index.
+        """
+        return self.filter(info__language_iexact=language)
+
+
+class SeatsUnavailable(Exception):
+    """
+    Raised when an event does not have enough free seats left.
+    """
+
+
+class EventQuerySet(LabQuerySet):
+
+    @query_guarantee(1, touch=lambda event: getattr(event, 'summary', None))
+    def with_summary(self):
+        """
+        Events along with their maintained sales summary, in 1 query.
+        Events without registration have no summary: accessing it raises
+        `EventSummary.DoesNotExist`, see `EventSummary.objects.for_events`.
+        """
+        return self.select_related('summary')
+
+    @query_guarantee(1, touch=lambda event: event.registrations_count)
+    def with_registration_counts(self):
+        """
+        Events annotated with `registrations_count`, in 1 query.
+        """
+        return self.with_related_counts('registrations')
+
+    @query_guarantee(1)
+    def with_free_seats(self, tickets=1):
+        """
+        Events having at least `tickets` free seats, in 1 query.
+        """
+        sold = Coalesce(F('ticket_number'), 0) + tickets
+        return self.filter(seat_number__gte=sold)
+
+    def sell_seats(self, event_id, tickets=1):
+        """
+        Counts `tickets` more sold tickets if that many seats are still
+        free, returns whether they were sold. The check and the increment
+        are a single statement: a concurrent sale of the same event waits
+        for the row lock then re-evaluates the condition against the
+        committed counter, so seats are never oversold:
+
+        >>> UPDATE event SET ticket_number = (COALESCE(event.ticket_number, 0) + 2)
+            WHERE (event.id = 1
+            AND event.seat_number >= (COALESCE(event.ticket_number, 0) + 2))
+        """
+        sold = Coalesce(F('ticket_number'), 0) + tickets
+        return bool(self.filter(pk=event_id, seat_number__gte=sold)
+                    .update(ticket_number=sold))
+
+
+class RegistrationQuerySet(LabQuerySet):
+
+    @query_guarantee(1, touch=lambda registration: (registration.member,
+                                                    registration.event))
+    def with_member_and_event(self):
+        """
+        Registrations along with their member and event, in 1 query:
+
+        >>> SELECT registration.*, member.*, event.* FROM registration
+            INNER JOIN member ON (registration.member_id = member.id)
+            INNER JOIN event ON (registration.event_id = event.id)
+        """
+        return self.select_related('member', 'event')
+
+    def reserve(self, event_id, member_id, tickets=1, **fields):
+        """
+        Sells `tickets` seats of the event and registers the member in the
+        same transaction, no row is locked beforehand. Raises
+        `SeatsUnavailable` when the event is (nearly) full; the sale is
+        rolled back when the registration can't be created, e.g. the
+        member is already registered.
+        """
+        events = self.model._meta.get_field('event').related_model.objects
+        with transaction.atomic(using=self.db):
+            if not events.db_manager(self.db).sell_seats(event_id, tickets):
+                raise SeatsUnavailable(
+                    "Event {0} has less than {1} free seats".format(
+                        event_id, tickets))
+            return self.create(event_id=event_id, member_id=member_id,
+                               ticket=tickets, **fields)
+
+    def bulk_upsert(self, rows, update_fields=('ticket', 'discount', 'online'),
+                    batch_size=1000):
+        """
+        Inserts the registrations (instances or dicts) or updates the
+        `update_fields` of the existing (member, event) ones, by batches
+        of `batch_size` rows in one transaction. Rows whose values did not
+        change are not rewritten. Returns the inserted/updated/unchanged
+        counts:
+
+        >>> INSERT INTO registration (member_id, event_id, ticket, ...)
+            VALUES (...), (...) ON CONFLICT (member_id, event_id)
+            DO UPDATE SET ticket = EXCLUDED.ticket, ...
+            WHERE (registration.ticket, ...) IS DISTINCT FROM
+                  (EXCLUDED.ticket, ...)
+            RETURNING (xmax = 0) AS inserted
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        fields = [f for f in opts.concrete_fields if not f.primary_key]
+        conflict = [opts.get_field(name) for name in ('member', 'event')]
+        updated = [opts.get_field(name) for name in update_fields]
+        table = qn(opts.db_table)
+        columns = ', '.join(qn(f.column) for f in fields)
+        placeholders = '({0})'.format(', '.join(['%s'] * len(fields)))
+        sql = ('INSERT INTO {table} ({columns}) VALUES {values} '
+               'ON CONFLICT ({conflict}) DO UPDATE SET {set} '
+               'WHERE ({current}) IS DISTINCT FROM ({excluded}) '
+               'RETURNING (xmax = 0) AS inserted')
+        set_sql = ', '.join('{0} = EXCLUDED.{0}'.format(qn(f.column))
+                            for f in updated)
+        current = ', '.join('{0}.{1}'.format(table, qn(f.column))
+                            for f in updated)
+        excluded = ', '.join('EXCLUDED.{0}'.format(qn(f.column))
+                             for f in updated)
+        total = inserted = changed = 0
+        rows = iter(rows)
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            while True:
+                # the same (member, event) can't be affected twice by one
+                # statement, the last row of the batch wins
+                batch = OrderedDict()
+                for row in rows:
+                    values = [f.get_db_prep_save(row_value(row, f), connection)
+                              for f in fields]
+                    batch[tuple(row_value(row, f) for f in conflict)] = values
+                    if len(batch) == batch_size:
+                        break
+                if not batch:
+                    break
+                total += len(batch)
+                cursor.execute(sql.format(
+                    table=table, columns=columns,
+                    values=', '.join([placeholders] * len(batch)),
+                    conflict=', '.join(qn(f.column) for f in conflict),
+                    set=set_sql, current=current, excluded=excluded),
+                    [value for values in batch.values() for value in values])
+                for (is_inserted,) in cursor.fetchall():
+                    if is_inserted:
+                        inserted += 1
+                    else:
+                        changed += 1
+            invalidate_model(self.model, using=self.db)
+        return UpsertResult(inserted, changed, total - inserted - changed)
+
+
+# same expression as `labs.queryset.aggregation.event_income`, the
+# triggers of migration 0007 apply it row by row
+EVENT_SUMMARY_SQL = """
+    INSERT INTO {summary} (event_id, registrations, tickets, income,
+                           discount_total, max_discount)
+    SELECT r.event_id, count(*), sum(r.ticket),
+           coalesce(sum(r.ticket::bigint * (100 - r.discount)
+                        * e.ticket_price / 100), 0),
+           sum(r.discount), max(r.discount)
+    FROM {registration} r INNER JOIN {event} e ON (r.event_id = e.id)
+    GROUP BY r.event_id
+"""
+
+
+class EventSummaryQuerySet(LabQuerySet):
+
+    def for_events(self, event_ids):
+        """
+        Summaries of `event_ids` in one primary key lookup, keyed by event
+        id. Events without registration get an empty summary:
+
+        >>> SELECT * FROM eventsummary WHERE event_id IN (1, 2, 3)
+        """
+        event_ids = list(event_ids)
+        summaries = self.in_bulk(event_ids)
+        for event_id in event_ids:
+            if event_id not in summaries:
+                summaries[event_id] = self.model(event_id=event_id)
+        return summaries
+
+    def rebuild(self):
+        """
+        Recomputes every summary from the registrations. The SHARE locks
+        block the registration and event writers, whose triggers would
+        race with the rebuild, until the transaction ends; readers keep
+        reading the previous summaries. Returns the number of summaries.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        event = self.model._meta.get_field('event').related_model
+        registration = event._meta.get_field('registrations').related_model
+        tables = dict(summary=qn(self.model._meta.db_table),
+                      registration=qn(registration._meta.db_table),
+                      event=qn(event._meta.db_table))
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            cursor.execute('LOCK TABLE {registration}, {event} '
+                           'IN SHARE MODE'.format(**tables))
+            cursor.execute('DELETE FROM {summary}'.format(**tables))
+            cursor.execute(EVENT_SUMMARY_SQL.format(**tables))
+            invalidate_model(self.model, using=self.db)
+            return cursor.rowcount
@@ -0,0 +1,78 @@
+"""
+Native serialization engine.
+
+Builds the `[{model, pk, fields}]` structure returned by
+`json.loads(serializers.serialize('json', objects))` straight from field
+values, without going through the serializer machinery and the JSON
+round trip.
+"""
+import uuid
+import decimal
+import datetime
+
+from django.contrib.postgres.fields.utils import AttributeSetter
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
+from django.utils.encoding import force_text, is_protected_type
+
+
+_encoder = DjangoJSONEncoder()
+
+PLAIN_TYPES = six.string_types + six.integer_types + (float, type(None))
+ENCODED_TYPES = (datetime.datetime, datetime.date, datetime.time,
+                 decimal.Decimal, uuid.UUID)
+
+
+def json_compatible(value):
+    """
+    Returns `value` as it would be after a `json.dumps` with the
+    `DjangoJSONEncoder` followed by a `json.loads`.
+    """
+    if isinstance(value, PLAIN_TYPES):
+        return value
+    if isinstance(value, dict):
+        return {force_text(k): json_compatible(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_compatible(v) for v in value]
+    if isinstance(value, ENCODED_TYPES):
+        return _encoder.default(value)
+    return value
+
+
+def encode_value(field, value):
+    """
+    Encodes a raw field value the way the python serializer does:
+    protected types are kept, everything else goes through
+    `field.value_to_string()` (ArrayField and HStoreField become JSON
+    strings, JSONField stays a structure).
+    """
+    if not is_protected_type(value):
+        value = field.value_to_string(AttributeSetter(field.attname, value))
+    return json_compatible(value)
+
+
+def dump_object(label, pk, fields):
+    return {
+        'model': label,
+        'pk': force_text(pk, strings_only=True),
+        'fields': fields
+    }
+
+
+def serialize_instance(obj, excluded_fields=()):
+    """
+    >>> serialize_instance(member)
+    {'model': 'common.member', 'pk': 1, 'fields': {...}}
+    """
+    metadata = obj.field_metadata()
+    fields = dict()
+    for name, attname, field in metadata.serialized_fields:
+        if name in excluded_fields:
+            continue
+        fields[name] = encode_value(field, getattr(obj, attname))
+    for name in metadata.serialized_m2m_fields:
+        if name in excluded_fields:
+            continue
+        pk_list = getattr(obj, name).values_list('pk', flat=True)
+        fields[name] = [force_text(pk, strings_only=True) for pk in pk_list]
+    return dump_object(metadata.label, obj.pk, fields)
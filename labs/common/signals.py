@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# sent by `query_statistic` with the `QueryStatistics` of the call,
+# connect a receiver to push them to a metrics pipeline.
+query_statistics_recorded = Signal(providing_args=['statistics'])
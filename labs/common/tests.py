@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .decorators import query_guarantees
+from .models import Community, Member, Event, Registration
+
+
+class QueryGuaranteeTests(TestCase):
+    """
+    Each `query_guarantee` holds for several rows and several related
+    objects per row, the count doesn't grow with them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now()
+        communities = [
+            Community.objects.create(name='community_{0}'.format(i),
+                                     locations=[[48.8 + i / 100.0, 2.3],
+                                                [48.9, 2.4 + i / 100.0]])
+            for i in range(3)]
+        events = [
+            Event.objects.create(name='event_{0}'.format(i), start=start,
+                                 end=start + timedelta(hours=2),
+                                 ticket_number=0, ticket_price=10,
+                                 seat_number=100)
+            for i in range(3)]
+        for i in range(6):
+            member = Member.objects.create(
+                first_name='member', last_name=str(i),
+                community=communities[i % len(communities)],
+                skills=['Python', 'Django'] if i % 2 else ['python'],
+                info={'languages': [{'name': 'French', 'level': 5}]},
+                contact={'city': 'Paris'})
+            for event in events[:2]:
+                Registration.objects.create(member=member, event=event,
+                                            online=bool(i % 2))
+
+    def assertQueryGuarantees(self, model):
+        manager = model._default_manager
+        guarantees = list(query_guarantees(type(manager.all())))
+        self.assertTrue(guarantees)
+        for name, queries, touch, args in guarantees:
+            queryset = getattr(manager.all(), name)(*args)
+            with self.assertNumQueries(queries):
+                objects = list(queryset)
+                if touch is not None:
+                    for obj in objects:
+                        touch(obj)
+            self.assertGreater(len(objects), 1, "{0}.objects.{1}()".format(
+                model.__name__, name))
+
+    def test_community_guarantees(self):
+        self.assertQueryGuarantees(Community)
+
+    def test_member_guarantees(self):
+        self.assertQueryGuarantees(Member)
+
+    def test_event_guarantees(self):
+        self.assertQueryGuarantees(Event)
+
+    def test_registration_guarantees(self):
+        self.assertQueryGuarantees(Registration)
@@ -1,4 +1,7 @@
-from jsonschema import validate as validate_schema
+import re
+
+from jsonschema import Draft4Validator
+from jsonschema.validators import extend
 from jsonschema.exceptions import ValidationError as Draft4ValidationError
 from django.core.exceptions import ValidationError
 
@@ -34,29 +37,102 @@ skills_schema = {
     "items": {"type": "string", "maxItems": 8}
 }
 
+contact_schema = {
+    "type": "object",
+    "additionalProperties": {"type": ["string", "null"]}
+}
+
 location_schema = {
     "type": "array",
     "items": {"type": "array", "items": {"type": "number"}, "maxItems": 2}
 }
 
 
-def info_schema_validator(data):
+_compiled_patterns = dict()
+
+
+def _pattern(validator, pattern, instance, schema):
+    """
+    Same as the Draft4 `pattern` keyword with the regex compiled once.
+    """
+    if not validator.is_type(instance, "string"):
+        return
     try:
-        validate_schema(data, info_schema)
-    except Draft4ValidationError as e:
-        raise ValidationError(e.message)
+        regex = _compiled_patterns[pattern]
+    except KeyError:
+        regex = _compiled_patterns[pattern] = re.compile(pattern)
+    if not regex.search(instance):
+        yield Draft4ValidationError(
+            "%r does not match %r" % (instance, pattern))
+
+
+LabValidator = extend(Draft4Validator, {"pattern": _pattern})
+
+
+def build_validator(schema):
+    """
+    Checks `schema` once and returns a reusable validator instance.
+    """
+    LabValidator.check_schema(schema)
+    return LabValidator(schema)
+
+
+info_validator = build_validator(info_schema)
+skills_validator = build_validator(skills_schema)
+location_validator = build_validator(location_schema)
+contact_validator = build_validator(contact_schema)
+
+MEMBER_VALIDATORS = {
+    'info': info_validator,
+    'skills': skills_validator,
+    'contact': contact_validator,
+}
+COMMUNITY_VALIDATORS = {
+    'locations': location_validator,
+}
+
+# values skipped by the model field validators
+EMPTY_VALUES = (None, '', [], (), {})
+
+
+def _validate(validator, data):
+    for error in validator.iter_errors(data):
+        raise ValidationError(error.message)
+
+
+def info_schema_validator(data):
+    _validate(info_validator, data)
 
 
 def skills_schema_validator(data):
-    try:
-        validate_schema(data, skills_schema)
-    except Draft4ValidationError as e:
-        raise ValidationError(e.message)
+    _validate(skills_validator, data)
 
 
 def location_schema_validator(data):
-    try:
-        validate_schema(data, location_schema)
-    except Draft4ValidationError as e:
-        raise ValidationError(e.message)
+    _validate(location_validator, data)
+
+
+def validate_batch(rows, validators=MEMBER_VALIDATORS):
+    """
+    Validates the fields of every row (dict or model instance) against
+    the pre-built `validators` in one pass and returns all the errors
+    indexed by row:
 
+    >>> validate_batch([{'skills': ['python']}, {'skills': 'python'}])
+    {1: {'skills': ["'python' is not of type 'array'"]}}
+    """
+    errors = dict()
+    fields = list(validators.items())
+    for index, row in enumerate(rows):
+        if isinstance(row, dict):
+            get = row.get
+        else:
+            get = lambda name, default=None: getattr(row, name, default)
+        for field, validator in fields:
+            value = get(field)
+            if value in EMPTY_VALUES:
+                continue
+            messages = [e.message for e in validator.iter_errors(value)]
+            if messages:
+                errors.setdefault(index, {})[field] = messages
+    return errors
@@ -1,6 +1,6 @@
 from django.db.models import Max, Avg, Sum, F
 
-from labs.common.models import Registration
+from labs.common.models import Registration, Event, EventSummary
 
 
 def highest_discount(event_id=1):
@@ -56,3 +56,49 @@ def event_income():
     events_income = registration_list.annotate(income=Sum(tickets_price))
     for e in events_income:
         print("{event__name} reaches {income}$ as an income".format(**e))
+
+
+def event_income_cached():
+    """
+    Same as `event_income`, from the queryset cache until a registration
+    or an event is written.
+    """
+    tickets_price = F('ticket') * (100 - F('discount')) * F('event__ticket_price') / 100
+    registration_list = Registration.objects.values('event__name').cached(60)
+    events_income = registration_list.annotate(income=Sum(tickets_price))
+    for e in events_income:
+        print("{event__name} reaches {income}$ as an income".format(**e))
+
+
+# Maintained summary
+###############
+# the aggregates above scan every registration of the event at each call,
+# the triggers of migration 0007 keep them in the eventsummary table.
+
+
+def highest_discount_from_summary(event_id=1):
+    """
+    >>> SELECT * FROM eventsummary WHERE eventsummary.event_id IN (event_id)
+    """
+    summary = EventSummary.objects.for_events([event_id])[event_id]
+    print({'max_discount': summary.max_discount})
+
+
+def total_sold_tickets_from_summary(event_id=1):
+    """
+    >>> SELECT * FROM eventsummary WHERE eventsummary.event_id IN (event_id)
+    """
+    summary = EventSummary.objects.for_events([event_id])[event_id]
+    print({'total_ticket': summary.tickets,
+           'avg_discount': summary.average_discount})
+
+
+def event_income_from_summary():
+    """
+    >>> SELECT event.name, eventsummary.income FROM event
+        LEFT OUTER JOIN eventsummary ON (event.id = eventsummary.event_id)
+    """
+    events_income = Event.objects.values('name', 'summary__income')
+    for e in events_income:
+        print("{name} reaches {income}$ as an income".format(
+            name=e['name'], income=e['summary__income'] or 0))
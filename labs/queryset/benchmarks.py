@@ -0,0 +1,165 @@
+"""
+Benchmark scenarios of the queryset labs.
+
+Each scenario seeds the rows it needs for a given scale, runs one lab
+function and cleans up after itself, so runs can be repeated. The seeded
+rows are prefixed with `bench_`, run the benchmarks on an empty database
+to get meaningful numbers for the read scenarios.
+"""
+import random
+from datetime import timedelta
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from labs.common.models import Community, Member, Event, Registration
+
+from labs.common.generators import communities
+
+from . import (aggregation, bulk_operations, related_objects,
+               f_expression, proximity)
+
+
+BATCH_SIZE = 5000
+PREFIX = 'bench_'
+
+
+def create_communities(scale):
+    communities = (Community(name='{0}{1}'.format(PREFIX, i))
+                   for i in range(scale))
+    _bulk_create(Community, communities)
+
+
+def seed(scale):
+    """
+    Creates `scale` members spread over `scale / 100` communities and
+    events, each member registered to up to 3 events.
+    """
+    rnd = random.Random(scale)
+    groups = max(scale // 100, 1)
+    start = timezone.now()
+    _bulk_create(Community, (Community(name='{0}{1}'.format(PREFIX, i))
+                             for i in range(groups)))
+    _bulk_create(Event, (Event(name='{0}{1}'.format(PREFIX, i),
+                               start=start, end=start + timedelta(hours=4),
+                               ticket_number=rnd.randint(0, 200),
+                               ticket_price=rnd.randint(5, 50),
+                               seat_number=rnd.randint(0, 200))
+                         for i in range(groups)))
+    community_ids = list(Community.objects.filter(
+        name__startswith=PREFIX).values_list('pk', flat=True))
+    event_ids = list(Event.objects.filter(
+        name__startswith=PREFIX).values_list('pk', flat=True))
+    _bulk_create(Member, (Member(first_name=PREFIX, last_name=str(i),
+                                 community_id=rnd.choice(community_ids))
+                          for i in range(scale)))
+    member_ids = Member.objects.filter(
+        first_name=PREFIX).values_list('pk', flat=True)
+    _bulk_create(Registration, (
+        Registration(member_id=member_id, event_id=event_id, online=False)
+        for member_id in member_ids.iterator()
+        for event_id in rnd.sample(event_ids, min(3, len(event_ids)))))
+
+
+def clean(scale=None):
+    Registration.objects.filter(member__first_name=PREFIX).delete()
+    Member.objects.filter(first_name=PREFIX).delete()
+    Event.objects.filter(name__startswith=PREFIX).delete()
+    Community.objects.filter(name__startswith=PREFIX).delete()
+
+
+def create_located_communities(scale):
+    """
+    Creates `scale` communities having 1 to 5 locations each.
+    """
+    def named(community_list):
+        for i, community in enumerate(community_list):
+            community.name = '{0}{1}'.format(PREFIX, i)
+            yield community
+    _bulk_create(Community, named(communities(scale, seed=scale)))
+
+
+def _bulk_create(model, objects):
+    batch = list()
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = list()
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+class Scenario(object):
+    """
+    A lab function along with the fixtures it needs. `sized` functions
+    receive the scale as their `size` argument, `prefixed` ones create or
+    select the communities named with `PREFIX` through their `prefix`
+    argument, so that `clean()` deletes them.
+    """
+
+    def __init__(self, func, setup=None, teardown=clean, sized=False,
+                 prefixed=False):
+        self.name = '{0}.{1}'.format(func.__module__.split('.')[-1],
+                                     func.__name__)
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+        self.sized = sized
+        self.prefixed = prefixed
+
+    def __call__(self, scale):
+        kwargs = dict()
+        if self.sized:
+            kwargs['size'] = scale
+        if self.prefixed:
+            kwargs['prefix'] = PREFIX
+        return self.func(**kwargs)
+
+
+SCENARIOS = OrderedDict((s.name, s) for s in [
+    # bulk operations
+    Scenario(bulk_operations.insert_list_worse_practice, sized=True,
+             prefixed=True),
+    Scenario(bulk_operations.insert_list_better_practice, sized=True,
+             prefixed=True),
+    Scenario(bulk_operations.insert_list_best_practice, sized=True,
+             prefixed=True),
+    Scenario(bulk_operations.insert_list_copy_practice, sized=True,
+             prefixed=True),
+    Scenario(bulk_operations.update_list_worse_practice, create_communities,
+             prefixed=True),
+    Scenario(bulk_operations.update_list_better_paractice, create_communities,
+             prefixed=True),
+    Scenario(bulk_operations.update_list_best_practice, create_communities,
+             prefixed=True),
+    Scenario(bulk_operations.update_per_row_worse_practice, seed),
+    Scenario(bulk_operations.update_per_row_best_practice, seed),
+    Scenario(bulk_operations.delete_list_best_practice, create_communities,
+             prefixed=True),
+    Scenario(bulk_operations.delete_list_chunked_practice, create_communities,
+             prefixed=True),
+    # related objects
+    Scenario(related_objects.community_per_member_non_optimised, seed),
+    Scenario(related_objects.community_per_member_optimised, seed),
+    Scenario(related_objects.members_per_community_non_optimised, seed),
+    Scenario(related_objects.members_per_community_optimised, seed),
+    Scenario(related_objects.events_per_member_non_optimised, seed),
+    Scenario(related_objects.events_per_member_optimised_1, seed),
+    Scenario(related_objects.events_per_member_optimised_2, seed),
+    Scenario(related_objects.events_per_member_optimised_3, seed),
+    # aggregation
+    Scenario(aggregation.event_income, seed),
+    Scenario(aggregation.event_income_from_summary, seed),
+    Scenario(aggregation.event_income_cached, seed),
+    # proximity search, e.g. `bench_labs -s 100k -k proximity.communities_within`
+    Scenario(proximity.communities_within_non_optimised,
+             create_located_communities),
+    Scenario(proximity.communities_within, create_located_communities),
+    Scenario(proximity.nearest_communities, create_located_communities),
+    # F() expressions
+    Scenario(f_expression.has_enough_seats_gotcha, seed),
+    Scenario(f_expression.has_enough_seats, seed),
+    Scenario(f_expression.welcome_discount_non_optimized, seed),
+    Scenario(f_expression.welcome_discount_optimized, seed),
+])
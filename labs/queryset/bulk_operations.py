@@ -2,7 +2,7 @@ from django.db.models import Value
 from django.db import transaction
 from django.db.models.functions import Concat
 
-from labs.common.models import Community
+from labs.common.models import Community, Registration
 from labs.common.decorators import query_statistic
 
 
@@ -11,28 +11,30 @@ from labs.common.decorators import query_statistic
 
 
 @query_statistic
-def insert_list_worse_practice():
+def insert_list_worse_practice(size=2000, prefix='community_'):
     """
-    Hits the DB 2000 and auto-commits each time.
+    Hits the DB 2000 and auto-commits each time. The communities are
+    named `prefix` followed by their index, the update and delete labs
+    below work on the communities whose name starts with `prefix`.
     """
-    for i in range(2000):
-        name = "community_{0}".format(i)
+    for i in range(size):
+        name = "{0}{1}".format(prefix, i)
         Community.objects.create(name=name)
 
 
 @query_statistic
-def insert_list_better_practice():
+def insert_list_better_practice(size=2000, prefix='community_'):
     """
     Hits the DB 2000 but commits once at the end.
     """
     with transaction.atomic():
-        for i in range(2000):
-            name = "community_{0}".format(i)
+        for i in range(size):
+            name = "{0}{1}".format(prefix, i)
             Community.objects.create(name=name)
 
 
 @query_statistic
-def insert_list_best_practice():
+def insert_list_best_practice(size=2000, prefix='community_'):
     """
     By default hits the DB once no matter how many objects, except in SQLite.
     How many objects can be created in a single query can be specified through
@@ -43,33 +45,50 @@ def insert_list_best_practice():
       - does not work with m2m relationships.
     """
     list_to_insert = list()
-    for i in range(2000):
-        name = "community_{0}".format(i)
+    for i in range(size):
+        name = "{0}{1}".format(prefix, i)
         list_to_insert.append(Community(name=name))
     Community.objects.bulk_create(list_to_insert)
 
 
+@query_statistic
+def insert_list_copy_practice(size=2000, prefix='community_'):
+    """
+    Streams the rows with PostgreSQL `COPY FROM STDIN`, no INSERT statement
+    is built at all and the rows are encoded while being sent, so it scales
+    to millions of rows without building them all in memory.
+
+    NB:
+      - save() will not be called, and the related signals will not be sent.
+      - does not work with m2m relationships.
+
+    >>> COPY community (name, locations) FROM STDIN
+    """
+    rows = ({'name': "{0}{1}".format(prefix, i)} for i in range(size))
+    Community.objects.bulk_copy(rows)
+
+
 ## Bulk update
 ##############
 
 
 @query_statistic
-def update_list_worse_practice():
+def update_list_worse_practice(prefix='community_'):
     """
     Hits the DB 2000 and auto-commits after each query.
     """
-    communities = Community.objects.filter(name__startswith='community')
+    communities = Community.objects.filter(name__startswith=prefix)
     for community in communities:
         community.name = community.name + ' e.V'
         community.save()
 
 
 @query_statistic
-def update_list_better_paractice():
+def update_list_better_paractice(prefix='community_'):
     """
     Hits the DB 2000 but commits once at the end.
     """
-    communities = Community.objects.filter(name__startswith='community')
+    communities = Community.objects.filter(name__startswith=prefix)
     with transaction.atomic():
         for community in communities:
             community.name = community.name + ' e.V'
@@ -77,7 +96,7 @@ def update_list_better_paractice():
 
 
 @query_statistic
-def update_list_best_practice():
+def update_list_best_practice(prefix='community_'):
     """
     Hits the DB once no matter how many objects.
     NB:
@@ -87,20 +106,116 @@ def update_list_best_practice():
     >>> UPDATE community SET name = (community.name + ' e.V')
         WHERE community.name LIKE 'community%'
     """
-    communities = Community.objects.filter(name__startswith='community')
+    communities = Community.objects.filter(name__startswith=prefix)
     communities.update(name=Concat('name', Value(' e.V')))
 
 
+@query_statistic
+def update_per_row_worse_practice():
+    """
+    Each registration gets its own discount: the queryset `update()` can't
+    express it, so every row is saved on its own.
+    """
+    registrations = Registration.objects.all()
+    with transaction.atomic():
+        for registration in registrations:
+            registration.discount = registration.pk % 50
+            registration.save(update_fields=['discount'])
+
+
+@query_statistic
+def update_per_row_best_practice():
+    """
+    Sends the per-row values as a VALUES list joined to the table, one
+    statement per batch of 1000 rows.
+
+    >>> UPDATE registration SET discount = v.discount
+        FROM (VALUES (1::integer, 1::integer), (2::integer, 2::integer), ...)
+        AS v (id, discount) WHERE registration.id = v.id
+    """
+    pk_list = Registration.objects.values_list('pk', flat=True)
+    rows = ({'pk': pk, 'discount': pk % 50} for pk in pk_list)
+    Registration.objects.bulk_update_values(rows, ['discount'])
+
+
+## Bulk upsert
+##############
+
+
+@query_statistic
+def upsert_list_worse_practice(rows):
+    """
+    Reads each registration, compares it and writes it back or creates it:
+    up to 2 queries per row.
+
+    `rows` is a list of dicts with member_id, event_id, ticket, discount
+    and online keys.
+    """
+    with transaction.atomic():
+        for row in rows:
+            try:
+                registration = Registration.objects.get(
+                    member_id=row['member_id'], event_id=row['event_id'])
+            except Registration.DoesNotExist:
+                Registration.objects.create(**row)
+                continue
+            changed = False
+            for field in ('ticket', 'discount', 'online'):
+                if getattr(registration, field) != row[field]:
+                    setattr(registration, field, row[field])
+                    changed = True
+            if changed:
+                registration.save()
+
+
+@query_statistic
+def upsert_list_best_practice(rows):
+    """
+    One `INSERT ... ON CONFLICT DO UPDATE` per batch of 1000 rows, the
+    unchanged rows are not rewritten.
+
+    >>> INSERT INTO registration (...) VALUES (...), (...)
+        ON CONFLICT (member_id, event_id) DO UPDATE SET ticket = EXCLUDED.ticket,
+        discount = EXCLUDED.discount, online = EXCLUDED.online
+        WHERE (...) IS DISTINCT FROM (...) RETURNING (xmax = 0) AS inserted
+    """
+    result = Registration.objects.bulk_upsert(rows)
+    print("{0.inserted} inserted, {0.updated} updated, "
+          "{0.unchanged} unchanged".format(result))
+
+
 ## Bulk delete
 ##############
 
 
 @query_statistic
-def delete_list_best_practice():
+def delete_list_best_practice(prefix='community_'):
     """
     Reduce the DB hits as much as possible depending on the DB performance.
     NB:
       - delete() will not be called, however still emit it's related signals
     """
-    communities = Community.objects.filter(name__startswith='community')
+    communities = Community.objects.filter(name__startswith=prefix)
     communities.delete()
+
+
+@query_statistic
+def delete_list_chunked_practice(chunk_size=500, prefix='community_'):
+    """
+    Deletes 500 communities per transaction without loading any row in
+    Python: their members and the members registrations are deleted with
+    one set-based statement each, so locks are held briefly and other
+    writers are not stalled.
+
+    >>> SELECT community.id FROM community WHERE community.name LIKE 'community%'
+        ORDER BY community.id LIMIT 500 FOR UPDATE
+    >>> DELETE FROM registration WHERE registration.member_id IN
+        (SELECT member.id FROM member WHERE member.community_id IN (...))
+    >>> DELETE FROM member WHERE member.community_id IN (...)
+    >>> DELETE FROM community WHERE community.id IN (...)
+    """
+    communities = Community.objects.filter(name__startswith=prefix)
+    report = communities.chunked_delete(chunk_size)
+    print("{0} rows deleted in {1} chunks ({2:.0f} rows/s), longest lock "
+          "{3:.4f}s".format(report.rows, len(report.chunks),
+                            report.rows_per_second, report.max_lock_time))
@@ -3,6 +3,7 @@ from django.db import transaction
 
 from labs.common.decorators import query_statistic
 from labs.common.models import Event, Registration
+from labs.common.querysets import SeatsUnavailable
 
 
 @query_statistic
@@ -64,3 +65,39 @@ def welcome_discount_optimized(discount_value=10):
     """
     registration_list = Registration.objects.filter()
     registration_list.update(discount=F('discount') + discount_value)
+
+
+@query_statistic
+def reserve_seats_gotcha(event_id=1, member_id=1, tickets=1):
+    """
+    Sells seats after checking the capacity at Python level.
+
+    Two concurrent requests can both read the last free seat then both
+    save: the event is oversold and one of the `ticket_number` increments
+    is lost.
+    """
+    with transaction.atomic():
+        event = Event.objects.get(pk=event_id)
+        if event.seat_number >= (event.ticket_number or 0) + tickets:
+            event.ticket_number = (event.ticket_number or 0) + tickets
+            event.save()
+            Registration.objects.create(event=event, member_id=member_id,
+                                        ticket=tickets, online=False)
+
+
+@query_statistic
+def reserve_seats(event_id=1, member_id=1, tickets=1):
+    """
+    Sells seats with a conditional update, the capacity check and the
+    increment happen in one statement so it is safe under concurrency.
+
+    >>> UPDATE event SET ticket_number = (COALESCE(event.ticket_number, 0) + 1)
+        WHERE (event.id = 1
+        AND event.seat_number >= (COALESCE(event.ticket_number, 0) + 1))
+    >>> INSERT INTO registration (...) VALUES (...)
+    """
+    try:
+        Registration.objects.reserve(event_id, member_id, tickets,
+                                     online=False)
+    except SeatsUnavailable as e:
+        print(e)
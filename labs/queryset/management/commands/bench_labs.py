@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import platform
+from timeit import default_timer
+
+from django.db import connection
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+
+from labs.common.instrumentation import QueryRecorder
+from labs.queryset.benchmarks import SCENARIOS
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+    import resource
+
+
+SCALES = '1k,100k,1M'
+UNITS = {'k': 10 ** 3, 'm': 10 ** 6}
+
+
+def parse_scale(value):
+    """
+    >>> parse_scale('100k')
+    100000
+    """
+    value = value.strip().lower()
+    try:
+        if value[-1] in UNITS:
+            return int(float(value[:-1]) * UNITS[value[-1]])
+        return int(value)
+    except (ValueError, IndexError):
+        raise CommandError("Invalid scale: {0}".format(value))
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class Devnull(object):
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the queryset labs at several scales'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-s', '--scales', dest='scales', default=SCALES,
+                            help='Comma separated scales, e.g. 1k,100k,1M')
+        parser.add_argument('-r', '--repeat', dest='repeat', type=int,
+                            default=3, help='Runs per scenario and scale')
+        parser.add_argument('-k', '--scenario', dest='scenarios',
+                            action='append', choices=list(SCENARIOS),
+                            help='Scenario to run, can be repeated (default: all)')
+        parser.add_argument('-o', '--output', dest='output',
+                            default='bench_labs.json', help='Results file')
+        parser.add_argument('-b', '--baseline', dest='baseline',
+                            help='Previous results file to compare with')
+        parser.add_argument('-t', '--tolerance', dest='tolerance', type=float,
+                            default=10.0,
+                            help='Allowed slowdown in percent before a '
+                                 'regression is reported')
+        parser.add_argument('--fail-on-regression', dest='fail',
+                            action='store_true', default=False,
+                            help='Exit with an error if a regression is found')
+
+    def handle(self, *args, **options):
+        if options.get('repeat') < 1:
+            raise CommandError("The repeat must be a positive integer")
+        scales = [parse_scale(s) for s in options.get('scales').split(',')]
+        names = options.get('scenarios') or list(SCENARIOS)
+        results = dict()
+        for name in names:
+            scenario = SCENARIOS[name]
+            results[name] = dict()
+            for scale in scales:
+                runs = [self.run(scenario, scale)
+                        for _ in range(options.get('repeat'))]
+                results[name][str(scale)] = summary = self.summarize(runs)
+                if tracemalloc:
+                    # tracing every allocation slows the scenario down,
+                    # the memory is measured on an extra untimed run
+                    summary['peak_memory'] = self.run(
+                        scenario, scale, trace_memory=True)['peak_memory']
+                self.output(
+                    "{0} @ {1}: {2:.4f}s (db {3:.4f}s), {4} queries, "
+                    "{5} rows, peak {6:.1f} MB".format(
+                        name, scale, summary['wall'], summary['db_time'],
+                        summary['queries'], summary['rows'],
+                        summary['peak_memory'] / 1e6),
+                    style="success")
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'repeat': options.get('repeat'),
+            'results': results,
+        }
+        with open(options.get('output'), 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        self.output("Results written to {0}".format(options.get('output')),
+                    style="success")
+        if options.get('baseline'):
+            regressions = self.compare(report, options.get('baseline'),
+                                       options.get('tolerance'))
+            if regressions and options.get('fail'):
+                raise CommandError(
+                    "{0} regression(s) found".format(len(regressions)))
+
+    def run(self, scenario, scale, trace_memory=False):
+        if scenario.setup:
+            scenario.setup(scale)
+        stdout, sys.stdout = sys.stdout, Devnull()
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            with QueryRecorder() as statistics:
+                start = default_timer()
+                scenario(scale)
+                wall = default_timer() - start
+            result = {'wall': wall, 'db_time': statistics.time,
+                      'queries': statistics.count, 'rows': statistics.rows}
+            if trace_memory:
+                result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            elif tracemalloc is None:
+                # process high-water mark, in kilobytes on linux
+                result['peak_memory'] = resource.getrusage(
+                    resource.RUSAGE_SELF).ru_maxrss * 1024
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            sys.stdout = stdout
+            if scenario.teardown:
+                scenario.teardown(scale)
+        return result
+
+    def summarize(self, runs):
+        summary = dict((key, median([run[key] for run in runs]))
+                       for key in runs[0])
+        walls = [run['wall'] for run in runs]
+        summary.update({'wall_min': min(walls), 'wall_max': max(walls),
+                        'runs': runs})
+        return summary
+
+    def compare(self, report, baseline_path, tolerance):
+        if not os.path.exists(baseline_path):
+            raise CommandError("{0} does not exist".format(baseline_path))
+        with open(baseline_path) as data:
+            baseline = json.load(data)['results']
+        regressions = list()
+        for name, scales in sorted(report['results'].items()):
+            for scale, current in sorted(scales.items()):
+                previous = baseline.get(name, {}).get(scale)
+                if previous is None:
+                    continue
+                change = (current['wall'] - previous['wall']) * 100.0 / \
+                    max(previous['wall'], 1e-9)
+                message = "{0} @ {1}: {2:.4f}s -> {3:.4f}s ({4:+.1f}%), " \
+                          "{5} -> {6} queries".format(
+                              name, scale, previous['wall'], current['wall'],
+                              change, previous['queries'], current['queries'])
+                if change > tolerance or current['queries'] > previous['queries']:
+                    regressions.append(message)
+                    self.output(message, style="error")
+                else:
+                    self.output(message, style="success")
+        return regressions
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
@@ -0,0 +1,62 @@
+import re
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+
+from labs.common.models import Member
+from labs.queryset.postgres import LAB_QUERIES
+
+
+EXECUTION_TIME = re.compile(r'Execution time: ([\d.]+) ms')
+
+# forces a sequential scan, as without the GIN indexes
+WITHOUT_INDEXES = [
+    'SET LOCAL enable_indexscan = off',
+    'SET LOCAL enable_bitmapscan = off',
+]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN ANALYZE the postgres lab queries with and without indexes'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-q', '--query', dest='queries', action='append',
+                            choices=[name for name, _ in LAB_QUERIES],
+                            help='Query to explain, can be repeated (default: all)')
+        parser.add_argument('--no-plan', dest='plan', action='store_false',
+                            default=True, help='Only print the timings')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE {0}'.format(
+                connection.ops.quote_name(Member._meta.db_table)))
+        names = options.get('queries')
+        for name, build_queryset in LAB_QUERIES:
+            if names and name not in names:
+                continue
+            sql, params = build_queryset().query.sql_with_params()
+            before = self.explain(sql, params, WITHOUT_INDEXES)
+            after = self.explain(sql, params)
+            self.output("{0}: {1:.3f} ms -> {2:.3f} ms".format(
+                name, self.execution_time(before),
+                self.execution_time(after)), style="success")
+            if options.get('plan'):
+                self.output("Before:\n{0}\nAfter:\n{1}\n".format(
+                    before, after), style="sql_field")
+
+    def explain(self, sql, params, settings=()):
+        # SET LOCAL only lasts until the end of the transaction
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in settings:
+                cursor.execute(statement)
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def execution_time(self, plan):
+        match = EXECUTION_TIME.search(plan)
+        return float(match.group(1)) if match else float('nan')
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
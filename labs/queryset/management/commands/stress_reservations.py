@@ -0,0 +1,148 @@
+import threading
+from datetime import timedelta
+from timeit import default_timer
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+
+from labs.common.models import Member, Event, Registration
+from labs.common.querysets import SeatsUnavailable
+
+try:
+    from queue import Queue, Empty
+except ImportError:  # python 2
+    from Queue import Queue, Empty
+
+
+PREFIX = 'stress_'
+
+
+class Command(BaseCommand):
+    help = ('Reserve the seats of one event from concurrent threads, check '
+            'nothing is oversold and report the reservations per second')
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-t', '--threads', dest='threads', type=int,
+                            default=8, help='Concurrent threads')
+        parser.add_argument('-s', '--seats', dest='seats', type=int,
+                            default=100, help='Seats of the event')
+        parser.add_argument('-a', '--attempts', dest='attempts', type=int,
+                            default=1000,
+                            help='Members trying to reserve, one attempt each')
+        parser.add_argument('-n', '--tickets', dest='tickets', type=int,
+                            default=1, help='Tickets per reservation')
+        parser.add_argument('--keep', dest='keep', action='store_true',
+                            default=False,
+                            help='Keep the event and members afterwards')
+
+    def handle(self, *args, **options):
+        for name in ('threads', 'seats', 'attempts', 'tickets'):
+            if options.get(name) < 1:
+                raise CommandError("--{0} must be a positive integer".format(
+                    name))
+        seats = options.get('seats')
+        tickets = options.get('tickets')
+        event, member_ids = self.setup(seats, options.get('attempts'))
+        try:
+            counts, duration = self.run(event.pk, member_ids, tickets,
+                                        options.get('threads'))
+            self.check(event, seats, tickets, counts, len(member_ids))
+        finally:
+            if not options.get('keep'):
+                self.clean(event)
+        self.output(
+            "{reserved} reservations, {unavailable} refused in {duration:.2f}s "
+            "({rate:.0f} reservations/s, {attempts:.0f} attempts/s)".format(
+                duration=duration,
+                rate=counts['reserved'] / duration,
+                attempts=len(member_ids) / duration,
+                **counts),
+            style="success")
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            # waits and checkout latency of the pooled backend
+            self.output("Connection pool: {0}".format(pool.as_dict()),
+                        style="sql_field")
+
+    def setup(self, seats, attempts):
+        start = timezone.now()
+        event = Event.objects.create(
+            name='{0}event'.format(PREFIX), start=start,
+            end=start + timedelta(hours=4),
+            ticket_number=0, ticket_price=10, seat_number=seats)
+        Member.objects.bulk_create(
+            [Member(first_name=PREFIX, last_name=str(i))
+             for i in range(attempts)], batch_size=5000)
+        member_ids = list(Member.objects.filter(
+            first_name=PREFIX).values_list('pk', flat=True))
+        return event, member_ids
+
+    def run(self, event_id, member_ids, tickets, threads):
+        pending = Queue()
+        for member_id in member_ids:
+            pending.put(member_id)
+        counts = {'reserved': 0, 'unavailable': 0}
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                try:
+                    member_id = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    Registration.objects.reserve(event_id, member_id,
+                                                 tickets, online=False)
+                    outcome = 'reserved'
+                except SeatsUnavailable:
+                    outcome = 'unavailable'
+                finally:
+                    # each thread has its own connection, returned to the
+                    # pool after every reservation: more threads than the
+                    # pool MAX_SIZE wait for a connection instead of
+                    # timing out
+                    connection.close()
+                with lock:
+                    counts[outcome] += 1
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = default_timer()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return counts, default_timer() - start
+
+    def check(self, event, seats, tickets, counts, attempts):
+        event.refresh_from_db()
+        registered = Registration.objects.filter(event=event).aggregate(
+            tickets=Sum('ticket'))['tickets'] or 0
+        sold = event.ticket_number
+        errors = list()
+        if sold > seats:
+            errors.append("{0} tickets sold for {1} seats".format(sold, seats))
+        if not sold == registered == counts['reserved'] * tickets:
+            errors.append(
+                "{0} tickets sold but {1} registered for {2} reservations"
+                .format(sold, registered, counts['reserved']))
+        if counts['reserved'] + counts['unavailable'] != attempts:
+            errors.append("{0} attempts failed".format(
+                attempts - counts['reserved'] - counts['unavailable']))
+        if attempts * tickets >= seats and seats - sold >= tickets:
+            errors.append("{0} seats left unsold".format(seats - sold))
+        if errors:
+            raise CommandError('; '.join(errors))
+        self.output("{0}/{1} seats sold, nothing oversold".format(
+            sold, seats), style="success")
+
+    def clean(self, event):
+        Registration.objects.filter(event=event).delete()
+        Member.objects.filter(first_name=PREFIX).delete()
+        event.delete()
+
+    def output(self, message, style):
+        style = getattr(self.style, style.upper())
+        self.stdout.write(style(message))
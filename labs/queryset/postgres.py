@@ -7,16 +7,35 @@ from labs.common.models import Member
 ###############
 
 
+def ruby_members():
+    """
+    Uses the GIN index on member.skills:
+
+    >>> SELECT * FROM member WHERE member.skills @> ARRAY['ruby']::varchar(30)[]
+    """
+    return Member.objects.filter(skills__contains=['ruby'])
+
+
 def has_ruby_skills():
     """
     >>> SELECT * FROM member WHERE member.skills @> ARRAY['ruby']::varchar(30)[]
     """
-    member_list = Member.objects.filter(skills__contains=['ruby'])
+    member_list = ruby_members()
     for member in member_list:
         skills = ', '.join(member.skills)
         print("{0} is familiar with : {1}".format(member, skills))
 
 
+def has_ruby_skills_cached():
+    """
+    Same as `has_ruby_skills`, from the queryset cache until a member is
+    written.
+    """
+    for member in ruby_members().cached(60):
+        skills = ', '.join(member.skills)
+        print("{0} is familiar with : {1}".format(member, skills))
+
+
 def has_all_skills_within_requirement(requirement=[]):
     """
     >>> SELECT * FROM member WHERE (CASE WHEN member.skills IS NULL THEN NULL 
@@ -34,18 +53,52 @@ def has_all_skills_within_requirement(requirement=[]):
         print("{0} is familiar with : {1}".format(member, skills))
 
 
-def match_any_of_requirement(requirement=[]):
+def members_matching_any(requirement=[]):
     """
+    Uses the GIN index on member.skills:
+
     >>> SELECT * WHERE member.skills && ARRAY['python', 'django', 'js', 'angular', 'ruby']::varchar(30)[]
     """
     if not requirement:
         requirement = ['python', 'django', 'js', 'angular', 'ruby']
-    member_list = Member.objects.filter(skills__overlap=requirement)
+    return Member.objects.filter(skills__overlap=requirement)
+
+
+def match_any_of_requirement(requirement=[]):
+    """
+    >>> SELECT * WHERE member.skills && ARRAY['python', 'django', 'js', 'angular', 'ruby']::varchar(30)[]
+    """
+    member_list = members_matching_any(requirement)
     for member in member_list:
         skills = ', '.join(member.skills)
         print("{0} matches {1} : {2}".format(member, len(skills), skills))
 
 
+def members_matching_any_ignoring_case(requirement=[]):
+    """
+    Uses the GIN index on lab_lower_array(member.skills):
+
+    >>> SELECT * WHERE lab_lower_array(member.skills)
+        && lab_lower_array(ARRAY['Python', 'Django', 'JS']::varchar[])
+    """
+    if not requirement:
+        requirement = ['Python', 'Django', 'JS', 'Angular', 'Ruby']
+    return Member.objects.filter(skills__icontains_any=requirement)
+
+
+def match_any_ignoring_case(requirement=[]):
+    """
+    Same as `match_any_of_requirement` whatever the casing of the skills:
+
+    >>> SELECT * WHERE lab_lower_array(member.skills)
+        && lab_lower_array(ARRAY['Python', 'Django', 'JS']::varchar[])
+    """
+    member_list = members_matching_any_ignoring_case(requirement)
+    for member in member_list:
+        skills = ', '.join(member.skills)
+        print("{0} matches : {1}".format(member, skills))
+
+
 def has_min_3_skills():
     """
     >>> SELECT * FROM member WHERE CASE WHEN member.skills IS NULL THEN NULL
@@ -57,11 +110,20 @@ def has_min_3_skills():
         print("{0} is familiar with : {1}".format(member, skills))
 
 
+def python_first_members():
+    """
+    Uses the btree index on UPPER(member.skills[1]::text):
+
+    >>> SELECT * WHERE UPPER(member.skills[1]::text) = UPPER('Python')
+    """
+    return Member.objects.filter(skills__0__iexact="Python")
+
+
 def python_as_first_skill():
     """
     >>> SELECT * WHERE UPPER(member.skills[1]::text) = UPPER('Python')
     """
-    member_list = Member.objects.filter(skills__0__iexact="Python")
+    member_list = python_first_members()
     for member in member_list:
         skills = ', '.join(member.skills)
         print("{0} loves python : {1}".format(member, skills))
@@ -93,18 +155,29 @@ def python_as_first_skill():
 #######################################
 
 
-def has_website():
+def members_with_website():
     """
-    Returns members who have the given key:
+    The `?` operator uses the GIN index on member.info:
 
     >>> SELECT * FROM member WHERE (member.info ? 'websites'
         AND NOT (member.info -> 'websites' = '[]'
         AND member.info IS NOT NULL))
     """
-    member_list = Member.objects.filter(
+    return Member.objects.filter(
         Q(info__has_key='websites'),
         ~Q(info__websites__exact=[])
     )
+
+
+def has_website():
+    """
+    Returns members who have the given key:
+
+    >>> SELECT * FROM member WHERE (member.info ? 'websites'
+        AND NOT (member.info -> 'websites' = '[]'
+        AND member.info IS NOT NULL))
+    """
+    member_list = members_with_website()
     for member in member_list:
         websites = ', '.join(member.info.get('websites'))
         print("{0} has {1} websites: {2}".format(
@@ -130,16 +203,67 @@ def has_work_and_presonal_phone():
     print("{0} members provided work and personal phone contact".format(count))
 
 
+def french_speakers():
+    """
+    Matches 'French', 'french', 'FRENCH', ... through the GIN index
+    on lab_language_names(member.info):
+
+    >>> SELECT * FROM member
+        WHERE lab_language_names(member.info) @> ARRAY[lower('French')]
+    """
+    return Member.objects.filter(info__language_iexact='French')
+
+
 def can_speak_french():
     """
-    Usual lookup (conatins, contained_by, gte, ...) still can be chained:
+    Custom lookups are registered on the field like the builtin ones:
 
     >>> SELECT COUNT(*) AS __count FROM member
-        WHERE (member.info -> 'languages' @> '[{name: French}]'
-        OR member.info -> 'languages' @> '[{name: french}]')
+        WHERE lab_language_names(member.info) @> ARRAY[lower('French')]
     """
-    count = Member.objects.filter(
-        Q(info__languages__contains=[{'name': 'French'}]) |
-        Q(info__languages__contains=[{'name': 'french'}])
-    ).count()
+    count = french_speakers().count()
     print("{0} members speak French.".format(count))
+
+
+def language_members(name='French'):
+    """
+    Containment on info -> 'languages' uses its jsonb_path_ops GIN index,
+    smaller than the jsonb_ops one on member.info, but the casing of
+    `name` must match the stored one:
+
+    >>> SELECT * FROM member
+        WHERE (member.info -> 'languages') @> '[{"name": "French"}]'
+    """
+    return Member.objects.filter(info__languages__contains=[{'name': name}])
+
+
+def city_contact_members(city='Berlin'):
+    """
+    hstore containment uses the GIN index on member.contact:
+
+    >>> SELECT * FROM member
+        WHERE member.contact @> hstore(ARRAY['city'], ARRAY['Berlin'])
+    """
+    return Member.objects.filter(contact__contains={'city': city})
+
+
+def has_city_contact(city='Berlin'):
+    """
+    >>> SELECT COUNT(*) AS __count FROM member
+        WHERE member.contact @> hstore(ARRAY['city'], ARRAY['Berlin'])
+    """
+    count = city_contact_members(city).count()
+    print("{0} members live in {1}.".format(count, city))
+
+
+# queries of the labs above, used by the `explain_postgres_labs` command
+LAB_QUERIES = [
+    ('has_ruby_skills', ruby_members),
+    ('match_any_of_requirement', members_matching_any),
+    ('match_any_ignoring_case', members_matching_any_ignoring_case),
+    ('python_as_first_skill', python_first_members),
+    ('has_website', members_with_website),
+    ('can_speak_french', french_speakers),
+    ('languages_containment', language_members),
+    ('has_city_contact', city_contact_members),
+]
@@ -0,0 +1,79 @@
+"""
+Proximity search
+------------------
+
+`Community.locations` holds [latitude, longitude] pairs. The trigger of
+migration 0008 copies each pair to the communitylocation table, indexed
+with GiST on its earthdistance position (cube and earthdistance
+extensions), so radius and nearest neighbour searches don't need to load
+every community.
+"""
+from math import radians, sin, cos, asin, sqrt
+
+from labs.common.decorators import query_statistic
+from labs.common.models import Community
+
+
+# earth radius used by the earthdistance extension
+EARTH_RADIUS = 6378.168  # km
+
+PARIS = (48.8, 2.3)
+
+
+def haversine(latitude, longitude, other_latitude, other_longitude):
+    """
+    Great circle distance in km between two points.
+    """
+    latitude, longitude, other_latitude, other_longitude = map(
+        radians, (latitude, longitude, other_latitude, other_longitude))
+    a = (sin((other_latitude - latitude) / 2) ** 2 + cos(latitude) *
+         cos(other_latitude) * sin((other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS * asin(sqrt(a))
+
+
+@query_statistic
+def communities_within_non_optimised(latitude=PARIS[0], longitude=PARIS[1],
+                                     km=50):
+    """
+    Loads every community and computes the distance of each of its
+    locations in Python.
+
+    >>> SELECT community.id, community.name, community.locations FROM community
+    """
+    found = list()
+    for community in Community.objects.all():
+        distances = [haversine(latitude, longitude, lat, lng)
+                     for lat, lng in community.locations or []]
+        distances = [d for d in distances if d <= km]
+        if distances:
+            found.append((min(distances), community))
+    found.sort(key=lambda item: item[0])
+    for distance, community in found:
+        print("{0} is {1:.1f} km away".format(community, distance))
+
+
+@query_statistic
+def communities_within(latitude=PARIS[0], longitude=PARIS[1], km=50):
+    """
+    Only the locations found in the earth box of the radius are read from
+    the GiST index, the exact distance is checked for them in the database:
+
+    >>> SELECT community.*, (SELECT min(earth_distance(...)) ...) AS distance
+        FROM community WHERE community.id IN (
+            SELECT location.community_id FROM communitylocation location
+            WHERE earth_box(ll_to_earth(48.8, 2.3), 50000) @> ll_to_earth(...)
+            AND earth_distance(ll_to_earth(48.8, 2.3), ll_to_earth(...)) <= 50000)
+        ORDER BY distance ASC
+    """
+    for community in Community.objects.within(latitude, longitude, km):
+        print("{0} is {1:.1f} km away".format(community, community.distance))
+
+
+@query_statistic
+def nearest_communities(latitude=PARIS[0], longitude=PARIS[1], k=10):
+    """
+    Widens the radius until it holds `k` communities, then returns the
+    `k` nearest of them.
+    """
+    for community in Community.objects.nearest(latitude, longitude, k):
+        print("{0} is {1:.1f} km away".format(community, community.distance))
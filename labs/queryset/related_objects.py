@@ -25,6 +25,17 @@ def all_communities():
         print(community.name)
 
 
+@query_statistic
+def all_communities_cached():
+    """
+    The results are kept in the queryset cache until a community is
+    written, following calls don't hit the database.
+    """
+    communities = Community.objects.cached(60)
+    for community in communities:
+        print(community.name)
+
+
 #############################################
 #### OneToOne / ForeignKey relationships ####
 #############################################
@@ -118,7 +129,9 @@ def events_per_member_non_optimised():
     """
     members = Member.objects.all()  # lazy evaluation
     # >>> SELECT member.id, member.name, member.community_id FROM member
-    for member in members.iterator():
+    # With psycopg2 iterator() still loads the whole result set in memory,
+    # a server-side cursor reads it 2000 rows at a time.
+    for member in members.server_side_iterator(2000):
         # Hits the database for each member to retrieve the associated events.
         events_number = member.events.count()
         # >>> SELECT COUNT(*) AS __count FROM event INNER JOIN registration
@@ -142,6 +155,9 @@ def events_per_member_optimised_1():
     >>> SELECT (registration.member_id) AS _prefetch_related_val_member_id, event.id,
         event.name, event.start, event.end FROM event INNER JOIN registration
         ON (event.id = registration.event_id) WHERE registration.member_id IN (1, 2, 3)
+
+    Every event row is loaded only to be counted, see
+    `events_per_member_optimised_3` when the count is all that is needed.
     """
 
     members = Member.objects.prefetch_related('events')
@@ -168,12 +184,34 @@ def events_per_member_optimised_2():
     #     event.end FROM registration INNER JOIN event ON (registration.event_id = event.id)
     #     WHERE registration.member_id IN (SELECT member.id FROM member)
     registration_dict = dict()
-    get = registration_dict.get
-    for registration in registrations.iterator(): # iterator() saves memory
-        member_id = registration.member_id
-        registration_dict[member_id] = get(member_id, []) + [registration.event]
-    for member in members.iterator():
+    # keyset pagination on the primary key keeps one chunk in memory at a time
+    # >>> ... WHERE registration.id > last_id ORDER BY registration.id LIMIT 2000
+    for registration in registrations.keyset_iterator(2000):
+        # appending in place, `get(member_id, []) + [event]` copies the list
+        # for every registration
+        registration_dict.setdefault(
+            registration.member_id, []).append(registration.event)
+    for member in members.server_side_iterator(2000):
+        print("{0} registred in {1} events".format(
+            member,
+            len(registration_dict.get(member.pk, []))
+        ))
+
+
+@query_statistic
+def events_per_member_optimised_3():
+    """
+    When only the number of related objects is needed, the counting is
+    done by the database and no event is loaded:
+
+    >>> SELECT member.id, member.name, member.community_id,
+        (SELECT COUNT(*) FROM registration related
+         WHERE related.member_id = member.id) AS events_count
+        FROM member
+    """
+    members = Member.objects.with_related_counts('events')
+    for member in members.server_side_iterator(2000):
         print("{0} registred in {1} events".format(
             member,
-            len(registration_dict[member_id])
+            member.events_count
         ))
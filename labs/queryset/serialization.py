@@ -0,0 +1,101 @@
+"""
+Serialization
+------------------
+
+`SerializationMixin.serialize()` used to call the django JSON serializer and
+parse its output back with `json.loads` only to return python objects. The
+native engine (`labs.common.serialization`) reads the field values straight
+into a dict and produces the same structure.
+"""
+
+from labs.common.decorators import time_statistic
+from labs.common.models import Member, Registration
+
+
+def populated_members(limit=2000):
+    """
+    Members having `info`, `skills` and `contact` filled in.
+
+    >>> SELECT * FROM member WHERE (member.info ? 'languages'
+        AND CASE WHEN member.skills IS NULL THEN NULL
+        ELSE coalesce(array_length(member.skills, 1), 0) END >= 1
+        AND member.contact IS NOT NULL) LIMIT 2000
+    """
+    members = Member.objects.filter(
+        info__has_key='languages',
+        skills__len__gte=1,
+        contact__isnull=False
+    )
+    return list(members[:limit])
+
+
+@time_statistic
+def serialize_json_round_trip(members):
+    """
+    Runs the django JSON serializer then `json.loads` for each member.
+    """
+    return [member.json_serialize() for member in members]
+
+
+@time_statistic
+def serialize_native(members):
+    """
+    Reads the field values of each member straight into a dict.
+    """
+    return [member.serialize() for member in members]
+
+
+def compare_serialization(limit=2000):
+    members = populated_members(limit)
+    reference = serialize_json_round_trip(members)
+    native = serialize_native(members)
+    mismatches = sum(1 for r, n in zip(reference, native) if r != n)
+    print("{0} members serialized, {1} mismatch(es).".format(
+        len(members), mismatches))
+
+
+@time_statistic
+def serialize_members_per_instance():
+    """
+    Builds a model instance then serializes it, one member at a time.
+    """
+    return [m.serialize()[0] for m in Member.objects.order_by('pk').iterator()]
+
+
+@time_statistic
+def serialize_members_bulk(chunk_size=2000):
+    """
+    Serializes the rows fetched with `values_list()` by chunks, no model
+    instance is built:
+
+    >>> SELECT member.id, member.first_name, ... FROM member
+        WHERE member.id > 2000 ORDER BY member.id ASC LIMIT 2000
+    """
+    return list(Member.objects.iter_serialized(chunk_size))
+
+
+@time_statistic
+def deep_serialize_registrations_per_instance():
+    """
+    Follows every ForeignKey with `getattr()`: one query per relation per
+    registration, and the same community is serialized for every member.
+    """
+    data = list()
+    for registration in Registration.objects.all():
+        data.extend(registration.deep_serialize())
+    print("{0} objects serialized.".format(len(data)))
+
+
+@time_statistic
+def deep_serialize_registrations_batched():
+    """
+    Resolves the related objects with one query per model and level:
+
+    >>> SELECT * FROM registration
+    >>> SELECT * FROM member WHERE member.id IN (1, 2, 3, ...)
+    >>> SELECT * FROM event WHERE event.id IN (1, 2, 3, ...)
+    >>> SELECT * FROM community WHERE community.id IN (1, 2, 3, ...)
+    """
+    result = Registration.objects.all().deep_serialize()
+    print("{0} objects serialized in {1} queries.".format(
+        len(result.objects), result.queries))